@@ -5,9 +5,118 @@ This work is licensed under the terms of the MIT license.
 For a copy, see <https://opensource.org/licenses/MIT>.
 """
 import asyncio
+import multiprocessing
+import signal
+from loguru import logger
+from typing import List, Optional
 from src.bot import bot
 from src.base import config
 
-c_bot = bot.ComboBot()
+SHUTDOWN_SIGNALS = (signal.SIGTERM, signal.SIGINT)
 
-asyncio.run(c_bot.start(token=config.TOKEN, reconnect=True))
+
+def install_event_loop():
+    """Uses uvloop for the event loop when it is enabled and installed"""
+    if not config.UVLOOP_ENABLED:
+        return
+    try:
+        import uvloop
+    except ImportError:
+        logger.info("uvloop is not installed, using the default event loop")
+        return
+    uvloop.install()
+    logger.info("Using the uvloop event loop")
+
+
+async def serve(shard_ids: Optional[List[int]] = None, process: int = 0):
+    """Runs the bot until it is closed or the process is asked to stop
+
+    SIGTERM and SIGINT start a graceful shutdown, and the coroutine only returns
+    once the shutdown has drained every queued write and closed the connections.
+
+    Arguments
+    ---------
+    shard_ids (Optional[List[int]]): The shards to run, or None for all
+    process (int): The index of the worker process, which offsets the metrics port
+    """
+    c_bot = bot.ComboBot(
+        shard_ids=shard_ids,
+        shard_count=config.SHARD_COUNT,
+        metrics_port=config.METRICS_PORT and config.METRICS_PORT + process,
+    )
+    shutdown: List[asyncio.Task] = []
+
+    def stop():
+        if not shutdown:
+            shutdown.append(asyncio.create_task(c_bot.close()))
+
+    loop = asyncio.get_running_loop()
+    for signum in SHUTDOWN_SIGNALS:
+        try:
+            loop.add_signal_handler(signum, stop)
+        except NotImplementedError:
+            pass
+    try:
+        with bot.phase("login"):
+            await c_bot.login(config.TOKEN)
+        await c_bot.connect(reconnect=True)
+    finally:
+        stop()
+        await shutdown[0]
+
+
+def run(shard_ids: Optional[List[int]] = None, process: int = 0):
+    """Runs the bot with the given shards until it is closed
+
+    Arguments
+    ---------
+    shard_ids (Optional[List[int]]): The shards to run, or None for all
+    process (int): The index of the worker process
+    """
+    install_event_loop()
+    asyncio.run(serve(shard_ids, process))
+
+
+def shard_ids_of(process: int) -> List[int]:
+    """Gets the shards a worker process runs
+
+    Arguments
+    ---------
+    process (int): The index of the worker process
+
+    Returns
+    -------
+    List[int]: Every SHARD_PROCESSES-th shard, starting at the process index
+    """
+    return list(range(process, config.SHARD_COUNT, config.SHARD_PROCESSES))
+
+
+def supervise():
+    """Runs one worker process per shard group, forwarding SIGTERM to them"""
+    if config.SHARD_COUNT is None:
+        raise ValueError("SHARD_COUNT must be set to run more than one process")
+    processes = [
+        multiprocessing.Process(target=run, args=(shard_ids_of(process), process))
+        for process in range(config.SHARD_PROCESSES)
+    ]
+    for process in processes:
+        process.start()
+
+    def forward(signum, frame):
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+
+    # SIGINT already reaches the workers through the process group.
+    signal.signal(signal.SIGTERM, forward)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    for index, process in enumerate(processes):
+        process.join()
+        logger.info(f"Worker {index} exited with code {process.exitcode}")
+
+
+if __name__ == "__main__":
+    if config.SHARD_PROCESSES > 1:
+        supervise()
+    else:
+        run()
@@ -0,0 +1,313 @@
+"""
+Copyright (c) 2023 Combo Gang. All rights reserved.
+
+This work is licensed under the terms of the MIT license.  
+For a copy, see <https://opensource.org/licenses/MIT>.
+"""
+import argparse
+import asyncio
+import random
+import sys
+import time
+from collections import Counter, defaultdict
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional
+
+import mongomock
+from loguru import logger
+
+from simulation import CountingDatabase, SimulatedDiscord
+from src.base import config
+from src.base.cache import DocumentCache
+from src.base.database import AsyncMongoDBUtility
+from src.base.metrics import METRICS
+from src.base.models import MemberRecord
+from src.bot.bot import ComboBot
+from src.bot.cogs import greetings
+
+SCENARIOS = {
+    "raid": {"join": 8, "nudge": 1, "leave": 1},
+    "verify-rush": {"verify": 9, "nudge": 1},
+    "mass-leave": {"leave": 1},
+    "mixed": {"join": 3, "verify": 3, "nudge": 2, "leave": 2},
+}
+SAMPLE_INTERVAL = 0.05
+# The event whose handlers are running, inherited by the tasks they are run in.
+EVENT: ContextVar[str] = ContextVar("EVENT")
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Gets a percentile of the values by the nearest rank
+
+    Arguments
+    ---------
+    values (List[float]): The values
+    q (float): The percentile between 0 and 1
+
+    Returns
+    -------
+    float: The percentile, or 0 without values
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class LoadGenerator:
+    """Replays gateway event storms against a ComboBot on a simulated Discord
+
+    The bot and its cogs run unchanged: simulation.py feeds synthetic gateway
+    payloads to discord.py, which dispatches them to the listeners and the
+    persistent views, and answers every REST call after a fixed latency. ComboData
+    lives in the given database, an in-memory Mongo stand-in by default, which is
+    installed as config.DATABASE for the run only and counts every operation.
+    Events arrive open-loop at a fixed rate, so slow handlers pile up the way they
+    would during a raid. An event's latency is the time until every handler it
+    dispatched has returned.
+
+    Arguments
+    ---------
+    members (int): Number of members the guild and ComboData start with
+    latency (float): Seconds every stubbed Discord API call takes
+    seed (int): Seed of the random event choice
+    database (Optional[AsyncMongoDBUtility]): The database to run against, or None for an in-memory one
+    """
+
+    def __init__(
+        self,
+        members: int = 1000,
+        latency: float = 0.05,
+        seed: int = 0,
+        database: Optional[AsyncMongoDBUtility] = None,
+    ):
+        self.members = members
+        self.bot = ComboBot()
+        self.bot.on_error = self._on_error
+        self.discord = SimulatedDiscord(self.bot, latency)
+        self.database = database or AsyncMongoDBUtility(
+            mongomock.MongoClient(), "CombosBotLoad", cache=DocumentCache()
+        )
+        self.database.sync.database = CountingDatabase(self.database.sync.database)
+        self.database.sync.database.database["ComboData"].insert_many(
+            [
+                MemberRecord(id, username=f"member{id}").to_document()
+                for id in range(1, members + 1)
+            ]
+        )
+        self.random = random.Random(seed)
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.depths: Dict[str, List[int]] = defaultdict(list)
+        self.errors: Counter = Counter()
+        self.skipped: Counter = Counter()
+        self.in_flight = 0
+        self.next_id = members + 1
+
+    def join(self):
+        """Sends a new member joining"""
+        self.discord.join(self.next_id)
+        self.next_id += 1
+
+    def leave(self):
+        """Sends a random member leaving, skipped once the guild is empty"""
+        member = self._member("leave")
+        if member is not None:
+            self.discord.leave(member)
+
+    def verify(self):
+        """Sends a random member clicking the verify button"""
+        member = self._member("verify")
+        if member is not None:
+            self.discord.click(member, "verify_button")
+
+    def nudge(self):
+        """Sends a random member clicking the nudge button of another random member"""
+        member = self._member("nudge")
+        if member is not None:
+            custom_id = f"{greetings.NUDGE_PREFIX}{self._member('nudge')}"
+            self.discord.click(member, custom_id)
+
+    def ready(self):
+        """Sends the ready events, reconciling the guild and seeding the stats"""
+        self.discord.ready()
+
+    async def run(self, scenario: str, rate: float, duration: float) -> Dict[str, Any]:
+        """Connects the bot, dispatches ready, then a scenario's events at a fixed rate
+
+        Arguments
+        ---------
+        scenario (str): The name of the event mix in SCENARIOS
+        rate (float): Events per second
+        duration (float): Seconds events are sent for
+
+        Returns
+        -------
+        Dict[str, Any]: The report of the run
+        """
+        with config.override(DATABASE=self.database):
+            await self.discord.start(self.members)
+            try:
+                await self.bot.load_cogs()
+                for view in self.bot.persistent_views:
+                    view.on_error = self._on_view_error
+                return await self._run(scenario, rate, duration)
+            finally:
+                self.bot.stats.stop()
+                self.discord.stop()
+
+    async def _run(self, scenario: str, rate: float, duration: float) -> Dict[str, Any]:
+        weights = SCENARIOS[scenario]
+        await self._measure("ready", self.ready)
+        counter = self.database.sync.database.counter
+        counter.clear()
+        self.discord.calls.clear()
+        sampler = asyncio.create_task(self._sample())
+        tasks = set()
+        events: Counter = Counter()
+        start = time.perf_counter()
+        while (elapsed := time.perf_counter() - start) < duration:
+            due = int(elapsed * rate) - sum(events.values())
+            for name in self.random.choices(
+                list(weights), list(weights.values()), k=max(due, 0)
+            ):
+                events[name] += 1
+                task = asyncio.create_task(self._measure(name, getattr(self, name)))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            await asyncio.sleep(0.001)
+        await asyncio.gather(*tasks)
+        await self.bot.membership.flush()
+        await self.database.flush()
+        sampler.cancel()
+        sent = sum(events.values())
+        return {
+            "scenario": scenario,
+            "rate": rate,
+            "events": dict(events),
+            "skipped": dict(self.skipped),
+            "seconds": time.perf_counter() - start,
+            "latency": {
+                name: {
+                    "count": len(values),
+                    "p50": percentile(values, 0.5),
+                    "p99": percentile(values, 0.99),
+                    "errors": self.errors[name],
+                }
+                for name, values in self.latencies.items()
+            },
+            "queue_depth": {
+                name: {"max": max(values), "mean": sum(values) / len(values)}
+                for name, values in self.depths.items()
+            },
+            "db_ops_per_event": sum(counter.values()) / sent if sent else 0.0,
+            "db_ops": dict(counter),
+            "api_calls_per_event": (
+                sum(self.discord.calls.values()) / sent if sent else 0.0
+            ),
+            "api_calls": dict(self.discord.calls),
+        }
+
+    async def _measure(self, name: str, send: Callable[[], None]):
+        EVENT.set(name)
+        before = asyncio.all_tasks()
+        self.in_flight += 1
+        start = time.perf_counter()
+        try:
+            # discord.py runs every listener and view callback in its own task.
+            send()
+            await asyncio.gather(*(asyncio.all_tasks() - before))
+        except Exception:
+            self.errors[name] += 1
+            logger.exception(f"{name} event failed")
+        finally:
+            self.latencies[name].append(time.perf_counter() - start)
+            self.in_flight -= 1
+
+    async def _on_error(self, event_method: str, *args, **kwargs):
+        self.errors[EVENT.get()] += 1
+        logger.exception(f"{event_method} failed")
+
+    async def _on_view_error(self, interaction, error: Exception, item):
+        self.errors[EVENT.get()] += 1
+        logger.opt(exception=error).error(f"{item} callback failed")
+
+    def _member(self, event: str) -> Optional[int]:
+        members = self.discord.guild.members
+        if not members:
+            self.skipped[event] += 1
+            return None
+        return self.random.choice(members).id
+
+    async def _sample(self):
+        while True:
+            self.depths["handlers"].append(self.in_flight)
+            self.depths["membership"].append(sum(self.bot.membership.stats().values()))
+            self.depths["write_behind"].append(
+                sum(len(pending) for pending in self.database.pending.values())
+            )
+            self.depths["mongo"].append(
+                sum(METRICS.in_flight["mongo_operation"].values())
+            )
+            self.depths["actions"].append(self.bot.actions.counters["in_flight"])
+            await asyncio.sleep(SAMPLE_INTERVAL)
+
+    def close(self):
+        """Closes the database"""
+        self.database.close()
+
+
+def format_report(report: Dict[str, Any]) -> str:
+    """Formats a run report as text
+
+    Arguments
+    ---------
+    report (Dict[str, Any]): The report returned by LoadGenerator.run
+
+    Returns
+    -------
+    str: The report as aligned lines
+    """
+    lines = [
+        f"{report['scenario']} at {report['rate']:g} events/s: "
+        f"{sum(report['events'].values())} events in {report['seconds']:.2f}s, "
+        f"{sum(report['skipped'].values())} skipped on an empty guild",
+        f"{'handler':<12}{'count':>8}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}",
+    ]
+    for name, latency in sorted(report["latency"].items()):
+        lines.append(
+            f"{name:<12}{latency['count']:>8}{latency['p50'] * 1000:>10.2f}"
+            f"{latency['p99'] * 1000:>10.2f}{latency['errors']:>8}"
+        )
+    lines.append(f"{'queue':<12}{'max':>8}{'mean':>10}")
+    for name, depth in sorted(report["queue_depth"].items()):
+        lines.append(f"{name:<12}{depth['max']:>8}{depth['mean']:>10.1f}")
+    operations = ", ".join(
+        f"{name} {count}" for name, count in sorted(report["db_ops"].items())
+    )
+    lines.append(f"DB ops per event: {report['db_ops_per_event']:.3f} ({operations})")
+    calls = ", ".join(
+        f"{route} {count}" for route, count in sorted(report["api_calls"].items())
+    )
+    lines.append(f"API calls per event: {report['api_calls_per_event']:.3f} ({calls})")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=LoadGenerator.__doc__.split("\n")[0])
+    parser.add_argument("--scenario", choices=SCENARIOS, default="mixed")
+    parser.add_argument("--rate", type=float, default=200, help="events per second")
+    parser.add_argument("--duration", type=float, default=10, help="seconds")
+    parser.add_argument("--members", type=int, default=1000)
+    parser.add_argument(
+        "--latency", type=float, default=0.05, help="seconds per Discord API call"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+    generator = LoadGenerator(args.members, args.latency, args.seed)
+    try:
+        report = asyncio.run(generator.run(args.scenario, args.rate, args.duration))
+    finally:
+        generator.close()
+    print(format_report(report))
@@ -0,0 +1,304 @@
+"""
+Copyright (c) 2023 Combo Gang. All rights reserved.
+
+This work is licensed under the terms of the MIT license.  
+For a copy, see <https://opensource.org/licenses/MIT>.
+"""
+import asyncio
+import itertools
+from collections import Counter
+from contextvars import Token
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from discord import ClientUser, Guild
+from discord.http import Route
+from discord.webhook.async_ import AsyncWebhookAdapter, async_context
+
+from src.base import config
+
+APPLICATION_ID = 10**16
+JOINED_AT = datetime(2024, 1, 1, tzinfo=timezone.utc).isoformat()
+
+
+class CountingCollection:
+    """Collection proxy counting every operation as one database round-trip"""
+
+    def __init__(self, collection, counter: Counter):
+        self.collection = collection
+        self.counter = counter
+
+    def __getattr__(self, name: str) -> Any:
+        attribute = getattr(self.collection, name)
+        if not callable(attribute):
+            return attribute
+
+        def call(*args, **kwargs):
+            self.counter[name] += 1
+            return attribute(*args, **kwargs)
+
+        return call
+
+
+class CountingDatabase:
+    """Database proxy handing out counting collections"""
+
+    def __init__(self, database):
+        self.database = database
+        self.counter: Counter = Counter()
+
+    def __getitem__(self, name: str) -> CountingCollection:
+        return CountingCollection(self.database[name], self.counter)
+
+    @property
+    def round_trips(self) -> int:
+        return sum(self.counter.values())
+
+
+def user_payload(id: int) -> Dict[str, Any]:
+    """Builds the gateway payload of a user
+
+    Arguments
+    ---------
+    id (int): The id of the user
+
+    Returns
+    -------
+    Dict[str, Any]: The user payload
+    """
+    return {
+        "id": str(id),
+        "username": f"member{id}",
+        "discriminator": "0",
+        "global_name": None,
+        "avatar": f"{id:032x}",
+    }
+
+
+def member_payload(id: int, roles: List[int] = ()) -> Dict[str, Any]:
+    """Builds the gateway payload of a guild member
+
+    Arguments
+    ---------
+    id (int): The id of the member
+    roles (List[int]): The ids of the roles of the member
+
+    Returns
+    -------
+    Dict[str, Any]: The member payload
+    """
+    return {
+        "user": user_payload(id),
+        "roles": [str(role) for role in roles],
+        "joined_at": JOINED_AT,
+        "deaf": False,
+        "mute": False,
+        "flags": 0,
+    }
+
+
+def guild_payload(members: int) -> Dict[str, Any]:
+    """Builds the gateway payload of the home guild with its roles and channels
+
+    Arguments
+    ---------
+    members (int): Number of members, with ids from 1 up
+
+    Returns
+    -------
+    Dict[str, Any]: The guild payload
+    """
+    guild_id = config.Ids.GUILD_ID.value
+    role_ids = [
+        guild_id,
+        config.Ids.VERIFIED_ROLE_ID.value,
+        config.Ids.UNVERIFIED_ROLE_ID.value,
+    ]
+    channel_ids = [id.value for id in config.Ids if id.name.endswith("_CHANNEL_ID")]
+    return {
+        "id": str(guild_id),
+        "name": "Combo's Services",
+        "icon": "0" * 32,
+        "owner_id": str(members + 1),
+        "member_count": members,
+        "roles": [
+            {
+                "id": str(id),
+                "name": str(id),
+                "permissions": "0",
+                "position": position,
+                "color": 0,
+                "hoist": False,
+                "managed": False,
+                "mentionable": False,
+            }
+            for position, id in enumerate(role_ids)
+        ],
+        "channels": [
+            {
+                "id": str(id),
+                "type": 0,
+                "name": str(id),
+                "position": position,
+                "guild_id": str(guild_id),
+                "permission_overwrites": [],
+            }
+            for position, id in enumerate(channel_ids)
+        ],
+        "members": [member_payload(id) for id in range(1, members + 1)],
+    }
+
+
+class SimulatedDiscord:
+    """Connects a ComboBot to a simulated Discord instead of the real one
+
+    Gateway events are built as payloads and fed to the bot's connection state, so
+    discord.py parses them and dispatches listeners and views as it would live. The
+    REST API is stubbed at HTTPClient.request and at the webhook adapter used by
+    interaction responses and followups: every call takes a fixed latency and
+    answers with a canned payload.
+
+    Arguments
+    ---------
+    bot (ComboBot): The bot, which must not be logged in
+    latency (float): Seconds every stubbed API call takes
+    """
+
+    def __init__(self, bot, latency: float = 0.05):
+        self.bot = bot
+        self.latency = latency
+        self.calls: Counter = Counter()
+        self.snowflakes = itertools.count(10**17)
+        self.guild: Optional[Guild] = None
+        self.adapter_token: Optional[Token] = None
+
+    async def request(self, route: Route, **kwargs: Any) -> Any:
+        """Answers one API call in place of Discord
+
+        Arguments
+        ---------
+        route (discord.http.Route): The route called
+
+        Returns
+        -------
+        Any: The response payload
+        """
+        self.calls[route.key] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if route.method == "POST" and route.path.endswith("/messages"):
+            return self.message(route.channel_id)
+        if (
+            route.method == "POST"
+            and route.path == "/webhooks/{webhook_id}/{webhook_token}"
+        ):
+            return self.message(self.guild.text_channels[0].id)
+        return None
+
+    def message(self, channel_id: int) -> Dict[str, Any]:
+        """Builds the payload of a message the bot sent
+
+        Arguments
+        ---------
+        channel_id (int): The id of the channel of the message
+
+        Returns
+        -------
+        Dict[str, Any]: The message payload
+        """
+        return {
+            "id": str(next(self.snowflakes)),
+            "channel_id": str(channel_id),
+            "author": user_payload(APPLICATION_ID),
+            "content": "",
+            "timestamp": JOINED_AT,
+            "edited_timestamp": None,
+            "tts": False,
+            "mention_everyone": False,
+            "mentions": [],
+            "mention_roles": [],
+            "attachments": [],
+            "embeds": [],
+            "pinned": False,
+            "type": 0,
+        }
+
+    async def start(self, members: int) -> Guild:
+        """Stubs the API and adds the home guild as if the gateway delivered it
+
+        Arguments
+        ---------
+        members (int): Number of members the guild starts with
+
+        Returns
+        -------
+        discord.Guild: The home guild
+        """
+        await self.bot._async_setup_hook()
+        state = self.bot._connection
+        state.user = ClientUser(state=state, data=user_payload(APPLICATION_ID))
+        state.application_id = APPLICATION_ID
+        self.bot.http.request = self.request
+        adapter = AsyncWebhookAdapter()
+        adapter.request = lambda route, session, **kwargs: self.request(route)
+        self.adapter_token = async_context.set(adapter)
+        self.guild = state._add_guild_from_data(guild_payload(members))
+        return self.guild
+
+    def stop(self):
+        """Restores the webhook adapter of interaction responses"""
+        if self.adapter_token is not None:
+            async_context.reset(self.adapter_token)
+            self.adapter_token = None
+
+    def ready(self):
+        """Dispatches the ready event of the guild's shard, then the ready event"""
+        self.bot.dispatch("shard_ready", self.guild.shard_id)
+        self.bot.dispatch("ready")
+
+    def join(self, id: int):
+        """Sends the gateway event of a member joining
+
+        Arguments
+        ---------
+        id (int): The id of the member
+        """
+        payload = {**member_payload(id), "guild_id": str(self.guild.id)}
+        self.bot._connection.parse_guild_member_add(payload)
+
+    def leave(self, id: int):
+        """Sends the gateway event of a member leaving
+
+        Arguments
+        ---------
+        id (int): The id of the member
+        """
+        payload = {"guild_id": str(self.guild.id), "user": user_payload(id)}
+        self.bot._connection.parse_guild_member_remove(payload)
+
+    def click(self, id: int, custom_id: str):
+        """Sends the gateway event of a member clicking a button
+
+        Arguments
+        ---------
+        id (int): The id of the member
+        custom_id (str): The custom id of the button
+        """
+        member = self.guild.get_member(id)
+        roles = [role.id for role in member.roles[1:]] if member else []
+        self.bot._connection.parse_interaction_create(
+            {
+                "id": str(next(self.snowflakes)),
+                "application_id": str(APPLICATION_ID),
+                "type": 3,
+                "token": "token",
+                "version": 1,
+                "guild_id": str(self.guild.id),
+                "channel": {"id": str(config.Ids.VERIFY_CHANNEL_ID.value), "type": 0},
+                "member": {**member_payload(id, roles), "permissions": "0"},
+                "data": {"custom_id": custom_id, "component_type": 2},
+                "app_permissions": "0",
+                "locale": "en-US",
+                "guild_locale": "en-US",
+            }
+        )
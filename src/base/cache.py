@@ -0,0 +1,178 @@
+"""
+Copyright (c) 2023 Combo Gang. All rights reserved.
+
+This work is licensed under the terms of the MIT license.  
+For a copy, see <https://opensource.org/licenses/MIT>.
+"""
+from threading import Lock
+from cachetools import TTLCache
+from typing import Optional, Dict, Any, Set, Tuple
+
+
+class DocumentCache:
+    """
+    Initialize the DocumentCache, a bounded TTL/LRU cache of documents keyed by
+    collection name and _id.
+
+    Entries read with an inclusion projection are cached as partial documents and
+    only serve later reads that need a subset of their fields. The cache is shared
+    by the database executor threads, so every access is guarded by a lock.
+
+    Every invalidation advances a clock. A reader takes a token before querying the
+    database and stores its result with it, so a document read before a concurrent
+    write and invalidation is never cached after it.
+
+    Params
+    ---------
+    @param maxsize (int): Maximum number of documents kept before the least recently used is evicted.
+    @param ttl (float): Seconds a document is kept before it has to be read again.
+
+    Returns
+    ---------
+    @returns None: No return value.
+    """
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 300) -> None:
+        self.documents: TTLCache[
+            Tuple[str, Any], Tuple[Dict[str, Any], bool]
+        ] = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.invalidated: TTLCache[Tuple[str, Any], int] = TTLCache(
+            maxsize=maxsize, ttl=ttl
+        )
+        self.collections_invalidated: Dict[str, int] = {}
+        self.clock = 0
+        self.lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(
+        self, collection_name: str, _id: Any, fields: Optional[Set[str]] = None
+    ) -> Optional[Dict[str, Any]]:
+        """Gets a cached document
+
+        Params
+        ---------
+        @param collection_name (str): Name of the MongoDB collection.
+        @param _id (Any): ID of the document.
+        @param fields (Optional[Set[str]]): Fields the caller needs, or None for the full document.
+
+        Returns
+        ---------
+        @returns Optional[Dict[str, Any]]: A copy of the cached document, or None on a miss.
+        """
+        with self.lock:
+            entry = self.documents.get((collection_name, _id))
+            if entry is None or not (
+                entry[1] or (fields is not None and fields <= entry[0].keys())
+            ):
+                self.misses += 1
+                return None
+            self.hits += 1
+            return dict(entry[0])
+
+    def token(self) -> int:
+        """Gets the token to store a document about to be read with
+
+        Returns
+        ---------
+        @returns int: The current invalidation clock.
+        """
+        with self.lock:
+            return self.clock
+
+    def set(
+        self,
+        collection_name: str,
+        document: Dict[str, Any],
+        full: bool = True,
+        token: Optional[int] = None,
+    ) -> None:
+        """Stores a document in the cache
+
+        Partial documents are merged into an existing partial entry.
+
+        Params
+        ---------
+        @param collection_name (str): Name of the MongoDB collection.
+        @param document (Dict[str, Any]): The document to be cached.
+        @param full (bool): Whether the document holds every field.
+        @param token (Optional[int]): Token taken before the document was read, which drops it if it was invalidated since.
+        """
+        key = (collection_name, document["_id"])
+        with self.lock:
+            if token is not None and (
+                self.invalidated.get(key, 0) > token
+                or self.collections_invalidated.get(collection_name, 0) > token
+            ):
+                return
+            entry = self.documents.get(key)
+            if full or entry is None:
+                self.documents[key] = (dict(document), full)
+            elif not entry[1]:
+                self.documents[key] = ({**entry[0], **document}, False)
+
+    def update(
+        self, collection_name: str, _id: Any, fields: Dict[str, Any], token: int
+    ) -> None:
+        """Applies fields written to a document to its cached entry
+
+        The entry is dropped instead if the document was invalidated since the token
+        was taken, as another write may have landed after this one.
+
+        Params
+        ---------
+        @param collection_name (str): Name of the MongoDB collection.
+        @param _id (Any): ID of the document.
+        @param fields (Dict[str, Any]): The fields written and their values.
+        @param token (int): Token taken before the write.
+        """
+        key = (collection_name, _id)
+        with self.lock:
+            if (
+                self.invalidated.get(key, 0) > token
+                or self.collections_invalidated.get(collection_name, 0) > token
+            ):
+                self.documents.pop(key, None)
+                return
+            document, full = self.documents.get(key, ({"_id": _id}, False))
+            self.documents[key] = ({**document, **fields}, full)
+
+    def invalidate(self, collection_name: str, _id: Any) -> None:
+        """Drops one document from the cache
+
+        Params
+        ---------
+        @param collection_name (str): Name of the MongoDB collection.
+        @param _id (Any): ID of the document.
+        """
+        with self.lock:
+            self.clock += 1
+            self.invalidated[(collection_name, _id)] = self.clock
+            self.documents.pop((collection_name, _id), None)
+
+    def invalidate_collection(self, collection_name: str) -> None:
+        """Drops every cached document of a collection
+
+        Params
+        ---------
+        @param collection_name (str): Name of the MongoDB collection.
+        """
+        with self.lock:
+            self.clock += 1
+            self.collections_invalidated[collection_name] = self.clock
+            for key in [key for key in self.documents if key[0] == collection_name]:
+                self.documents.pop(key, None)
+
+    def stats(self) -> Dict[str, int]:
+        """Gets the cache counters
+
+        Returns
+        ---------
+        @returns Dict[str, int]: The hit, miss and size counters.
+        """
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self.documents),
+            }
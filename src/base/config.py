@@ -5,12 +5,40 @@ This work is licensed under the terms of the MIT license.
 For a copy, see <https://opensource.org/licenses/MIT>.
 """
 import json
+import os
+from contextlib import contextmanager
+from functools import cache
+from typing import Any, Dict, Iterator
 from src.base import database
+from src.base.cache import DocumentCache
 from pymongo import MongoClient
 from pymongo.server_api import ServerApi
 from enum import Enum
 
 
+ROUTER_PATH = os.path.join(os.path.dirname(__file__), "router.json")
+MONGO_OPTIONS: Dict[str, Any] = {
+    "maxPoolSize": 20,
+    "minPoolSize": 2,
+    "connectTimeoutMS": 5000,
+    "serverSelectionTimeoutMS": 10000,
+    "compressors": "zlib",
+}
+
+
+@cache
+def get_router() -> Dict[str, str]:
+    """Gets the parsed router.json file, read only once
+
+    Returns
+    ---------
+    @returns Dict[str, str]: The paths of the secret files.
+    """
+    with open(ROUTER_PATH, "r") as file:
+        return json.load(file)
+
+
+@cache
 def get_token() -> str:
     """Gets the bot token from the router path in router.json file
 
@@ -18,12 +46,8 @@ def get_token() -> str:
     ---------
     @returns str: The bot token.
     """
-    with open("./src/base/router.json", "r") as file:
-        json_data = json.load(file)
-        token_path = json_data["token"]
-        with open(token_path, "r") as file:
-            token = file.read()
-            return token
+    with open(get_router()["token"], "r") as file:
+        return file.read()
 
 
 def get_mongo_key_path() -> str:
@@ -34,12 +58,10 @@ def get_mongo_key_path() -> str:
     @returns str: The mongo key path.
 
     """
-    with open("./src/base/router.json", "r") as file:
-        json_data = json.load(file)
-        mongo_path = json_data["mongo-key"]
-        return mongo_path
+    return get_router()["mongo-key"]
 
 
+@cache
 def get_mongo_uri() -> str:
     """Gets the mongo uri from the router path in router.json file
 
@@ -48,22 +70,110 @@ def get_mongo_uri() -> str:
     @returns str: The mongo uri.
 
     """
-    with open("./src/base/router.json", "r") as file:
-        json_data = json.load(file)
-        mongo_path = json_data["mongo-uri"]
-        with open(mongo_path, "r") as file:
-            mongo_uri = file.read()
-            return mongo_uri
-
-
-CLIENT = MongoClient(
-    get_mongo_uri(),
-    tls=True,
-    tlsCertificateKeyFile=get_mongo_key_path(),
-    server_api=ServerApi("1"),
-)
-DATABASE = database.MongoDBUtility(CLIENT, "CombosBot")
-TOKEN = get_token()
+    with open(get_router()["mongo-uri"], "r") as file:
+        return file.read()
+
+
+@cache
+def get_client() -> MongoClient:
+    """Gets the MongoClient, connecting on first use
+
+    Returns
+    ---------
+    @returns MongoClient: The client.
+    """
+    return MongoClient(
+        get_mongo_uri(),
+        tls=True,
+        tlsCertificateKeyFile=get_mongo_key_path(),
+        server_api=ServerApi("1"),
+        **MONGO_OPTIONS,
+    )
+
+
+@cache
+def get_database() -> database.AsyncMongoDBUtility:
+    """Gets the bot database, connecting on first use
+
+    Returns
+    ---------
+    @returns database.AsyncMongoDBUtility: The database.
+    """
+    utility = database.AsyncMongoDBUtility(
+        get_client(), "CombosBot", cache=DocumentCache(maxsize=50000, ttl=300)
+    )
+    if MIRROR_ENABLED:
+        utility.sync.enable_mirror(
+            "ComboData", MIRROR_REFRESH_INTERVAL, MIRROR_CHANGE_STREAMS
+        )
+    return utility
+
+
+METRICS_HOST = "127.0.0.1"
+# Worker process n of SHARD_PROCESSES serves on METRICS_PORT + n.
+METRICS_PORT = 9100
+METRICS_LOG_INTERVAL = 300
+
+LEAN_MODE = False
+LEAN_FETCH_CHUNK = 1000
+
+SHARD_COUNT = None
+SHARD_PROCESSES = 1
+UVLOOP_ENABLED = True
+
+PRESENCE_INTERVAL = 60
+
+COG_HOT_RELOAD = True
+COMMAND_HASH_PATH = os.path.join(os.path.dirname(__file__), "command_tree.sha256")
+
+WATCHDOG_ENABLED = False
+WATCHDOG_THRESHOLD = 0.25
+WATCHDOG_PROFILE = False
+WATCHDOG_LOG_PATH = "bot.log"
+
+MIRROR_ENABLED = False
+MIRROR_REFRESH_INTERVAL = 60
+MIRROR_CHANGE_STREAMS = True
+
+LAZY_ATTRIBUTES = {"CLIENT": get_client, "DATABASE": get_database, "TOKEN": get_token}
+
+
+def __getattr__(name: str) -> Any:
+    """Resolves CLIENT, DATABASE and TOKEN on first access so importing is free
+
+    Params
+    ---------
+    @param name (str): The attribute name.
+
+    Returns
+    ---------
+    @returns Any: The attribute value.
+    """
+    if name in LAZY_ATTRIBUTES:
+        return LAZY_ATTRIBUTES[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+@contextmanager
+def override(**attributes: Any) -> Iterator[None]:
+    """Replaces settings, or CLIENT, DATABASE and TOKEN, until the block exits
+
+    Params
+    ---------
+    @param attributes (Any): The names of the attributes and the values to use.
+    """
+    namespace = globals()
+    previous = {name: namespace[name] for name in attributes if name in namespace}
+    namespace.update(attributes)
+    try:
+        yield
+    finally:
+        for name in attributes:
+            if name in previous:
+                namespace[name] = previous[name]
+            else:
+                del namespace[name]
+
 
 class Ids(Enum):
     GUILD_ID = 1194856906133614643
@@ -4,10 +4,142 @@ Copyright (c) 2023 Combo Gang. All rights reserved.
 This work is licensed under the terms of the MIT license.  
 For a copy, see <https://opensource.org/licenses/MIT>.
 """
-from pymongo import MongoClient
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from collections import defaultdict
+from loguru import logger
+from pymongo import IndexModel, MongoClient, UpdateOne
 from pymongo.collection import Collection
-from pymongo.results import InsertOneResult, UpdateResult, DeleteResult
-from typing import Optional, List, Union, Dict, Any
+from pymongo.errors import DuplicateKeyError
+from pymongo.results import (
+    InsertOneResult,
+    UpdateResult,
+    DeleteResult,
+    BulkWriteResult,
+)
+from typing import Optional, List, Set, Union, Dict, Any, Callable
+from src.base.cache import DocumentCache
+from src.base.mirror import LocalMirror
+from src.base.metrics import METRICS
+
+
+def _query_id(query: Optional[Dict[str, Any]]) -> Any:
+    """Gets the _id a query targets when it can only match one document by _id
+
+    Params
+    ---------
+    @param query (Optional[Dict[str, Any]]): Query to inspect.
+
+    Returns
+    ---------
+    @returns Any: The targeted _id, or None if the query can match other documents.
+    """
+    if not query or "_id" not in query or isinstance(query["_id"], dict):
+        return None
+    return query["_id"]
+
+
+def _query_ids(query: Optional[Dict[str, Any]]) -> Optional[List[Any]]:
+    """Gets the _ids a query is limited to when it filters on one or a list of _ids
+
+    Params
+    ---------
+    @param query (Optional[Dict[str, Any]]): Query to inspect.
+
+    Returns
+    ---------
+    @returns Optional[List[Any]]: The _ids, or None if the query can match any document.
+    """
+    _id = _query_id(query)
+    if _id is not None:
+        return [_id]
+    if query and isinstance(query.get("_id"), dict) and query["_id"].keys() == {"$in"}:
+        return list(query["_id"]["$in"])
+    return None
+
+
+def _document_ids(documents: List[Dict[str, Any]]) -> List[Any]:
+    """Gets the _ids of documents about to be inserted
+
+    Params
+    ---------
+    @param documents (List[Dict[str, Any]]): The documents.
+
+    Returns
+    ---------
+    @returns List[Any]: The _ids the documents carry; documents without one get a new _id.
+    """
+    return [document["_id"] for document in documents if "_id" in document]
+
+
+def _projected_fields(
+    projection: Optional[Dict[str, Union[int, bool]]]
+) -> Optional[Set[str]]:
+    """Gets the fields an inclusion projection returns
+
+    Params
+    ---------
+    @param projection (Optional[Dict[str, Union[int, bool]]]): Fields to include/exclude.
+
+    Returns
+    ---------
+    @returns Optional[Set[str]]: The included fields, or None if the projection is not an inclusion.
+    """
+    if not projection:
+        return None
+    included = {field for field, value in projection.items() if value}
+    if not included - {"_id"}:
+        return None
+    return included | {"_id"}
+
+
+def _project(
+    document: Dict[str, Any], projection: Optional[Dict[str, Union[int, bool]]]
+) -> Dict[str, Any]:
+    """Applies a projection to an in-memory document
+
+    Params
+    ---------
+    @param document (Dict[str, Any]): The full document.
+    @param projection (Optional[Dict[str, Union[int, bool]]]): Fields to include/exclude.
+
+    Returns
+    ---------
+    @returns Dict[str, Any]: The projected document.
+    """
+    if not projection:
+        return document
+    included = {field for field, value in projection.items() if value}
+    if included - {"_id"}:
+        fields = included | ({"_id"} if projection.get("_id", 1) else set())
+        return {field: value for field, value in document.items() if field in fields}
+    return {
+        field: value
+        for field, value in document.items()
+        if field not in projection or projection[field]
+    }
+
+
+def _plan_stages(plan: Dict[str, Any]) -> List[str]:
+    """Gets every stage of a query plan
+
+    Params
+    ---------
+    @param plan (Dict[str, Any]): The plan from an explain result.
+
+    Returns
+    ---------
+    @returns List[str]: The stage names, outermost first.
+    """
+    stages = [plan["stage"]] if "stage" in plan else []
+    if "inputStage" in plan:
+        stages += _plan_stages(plan["inputStage"])
+    for stage in plan.get("inputStages", []):
+        stages += _plan_stages(stage)
+    if "queryPlan" in plan:
+        stages += _plan_stages(plan["queryPlan"])
+    return stages
 
 
 class MongoDBUtility:
@@ -18,19 +150,106 @@ class MongoDBUtility:
     ---------
     @param connection (str | MongoClient): MongoDB connection string or MongoClient instance.
     @param database_name (str): Name of the MongoDB database.
+    @param cache (Optional[DocumentCache]): Read-through cache for lookups by _id.
 
     Returns
     ---------
     @returns None: No return value.
     """
 
-    def __init__(self, connection: str | MongoClient, database_name: str) -> None:
+    def __init__(
+        self,
+        connection: str | MongoClient,
+        database_name: str,
+        cache: Optional[DocumentCache] = None,
+    ) -> None:
         self.client = (
-            connection
-            if isinstance(connection, MongoClient)
-            else MongoClient(connection)
+            MongoClient(connection) if isinstance(connection, str) else connection
         )
         self.database = self.client[database_name]
+        self.cache = cache
+        self.mirror: Optional[LocalMirror] = None
+        self.mirror_collection: Optional[str] = None
+
+    """
+    Mirror the specified collection in memory, serving reads by _id from the mirror.
+
+    Params
+    ---------
+    @param collection_name (str): Name of the MongoDB collection.
+    @param refresh_interval (float): Seconds between reloads when change streams are unavailable.
+    @param change_streams (bool): Whether to follow the change stream, or only reload.
+
+    Returns
+    ---------
+    @returns LocalMirror: The mirror, to be started with LocalMirror.start.
+    """
+
+    def enable_mirror(
+        self,
+        collection_name: str,
+        refresh_interval: float = 60,
+        change_streams: bool = True,
+    ) -> LocalMirror:
+        self.mirror = LocalMirror(
+            self.database[collection_name], refresh_interval, change_streams
+        )
+        self.mirror_collection = collection_name
+        return self.mirror
+
+    """
+    Get a document from the mirror without querying the database.
+
+    Params
+    ---------
+    @param collection_name (str): Name of the MongoDB collection.
+    @param _id (Any): ID of the document.
+    @param projection (Optional[Dict[str, Union[int, bool]]]): Fields to include/exclude in the result.
+
+    Returns
+    ---------
+    @returns Optional[Dict[str, Any]]: The mirrored document, or None if it is not mirrored.
+    """
+
+    def _mirrored(
+        self,
+        collection_name: str,
+        _id: Any,
+        projection: Optional[Dict[str, Union[int, bool]]] = None,
+    ) -> Optional[Dict[str, Any]]:
+        if collection_name != self.mirror_collection or not self.mirror.ready:
+            return None
+        document = self.mirror.get(_id)
+        return None if document is None else _project(document, projection)
+
+    """
+    Drop the cached documents a write to the specified collection may have changed.
+
+    Params
+    ---------
+    @param collection_name (str): Name of the MongoDB collection.
+    @param query (Optional[Dict[str, Any]]): Query or document of the write.
+
+    Returns
+    ---------
+    @returns None: No return value.
+    """
+
+    def _invalidate(
+        self, collection_name: str, query: Optional[Dict[str, Any]]
+    ) -> None:
+        ids = _query_ids(query)
+        # Writes to any document reach the mirror through its change stream only.
+        if collection_name == self.mirror_collection and ids is not None:
+            for _id in ids:
+                self.mirror.invalidate(_id)
+        if self.cache is None:
+            return
+        if ids is None:
+            self.cache.invalidate_collection(collection_name)
+        else:
+            for _id in ids:
+                self.cache.invalidate(collection_name, _id)
 
     """
     Insert a document into the specified collection.
@@ -48,6 +267,7 @@ class MongoDBUtility:
     def insert_document(self, collection_name: str, document: Dict[str, Any]) -> Any:
         collection: Collection = self.database[collection_name]
         result: InsertOneResult = collection.insert_one(document)
+        self._invalidate(collection_name, {"_id": result.inserted_id})
         return result.inserted_id
 
     """
@@ -94,6 +314,9 @@ class MongoDBUtility:
         query: Optional[Dict[str, Any]] = None,
         projection: Optional[Dict[str, Union[int, bool]]] = None,
     ) -> Optional[Dict[str, Any]]:
+        _id = _query_id(query)
+        if _id is not None and len(query) == 1:
+            return self.find_document_by_id(collection_name, _id, projection)
         collection: Collection = self.database[collection_name]
         return collection.find_one(query, projection)
 
@@ -116,6 +339,29 @@ class MongoDBUtility:
     ) -> int:
         collection: Collection = self.database[collection_name]
         result: UpdateResult = collection.update_one(query, {"$set": update})
+        self._invalidate(collection_name, query)
+        return result.modified_count
+
+    """
+    Update all documents in the specified collection matching the query.
+
+    Params
+    ---------
+    @param collection_name (str): Name of the MongoDB collection.
+    @param query (Dict[str, Any]): Query to filter documents to be updated.
+    @param update (Dict[str, Any]): Update operation to be applied.
+
+    Returns
+    ---------
+    @returns int: The number of documents modified.
+    """
+
+    def update_documents(
+        self, collection_name: str, query: Dict[str, Any], update: Dict[str, Any]
+    ) -> int:
+        collection: Collection = self.database[collection_name]
+        result: UpdateResult = collection.update_many(query, {"$set": update})
+        self._invalidate(collection_name, query)
         return result.modified_count
 
     """
@@ -134,6 +380,26 @@ class MongoDBUtility:
     def delete_document(self, collection_name: str, query: Dict[str, Any]) -> int:
         collection: Collection = self.database[collection_name]
         result: DeleteResult = collection.delete_one(query)
+        self._invalidate(collection_name, query)
+        return result.deleted_count
+
+    """
+    Delete all documents in the specified collection matching the query.
+
+    Params
+    ---------
+    @param collection_name (str): Name of the MongoDB collection.
+    @param query (Dict[str, Any]): Query to filter documents to be deleted.
+
+    Returns
+    ---------
+    @returns int: The number of documents deleted.
+    """
+
+    def delete_documents(self, collection_name: str, query: Dict[str, Any]) -> int:
+        collection: Collection = self.database[collection_name]
+        result: DeleteResult = collection.delete_many(query)
+        self._invalidate(collection_name, query)
         return result.deleted_count
 
     """
@@ -154,7 +420,40 @@ class MongoDBUtility:
         self, collection_name: str, query: Dict[str, Any], update: Dict[str, Any]
     ) -> Optional[Dict[str, Any]]:
         collection: Collection = self.database[collection_name]
-        return collection.find_one_and_update(query, {"$set": update})
+        document = collection.find_one_and_update(query, {"$set": update})
+        self._invalidate(
+            collection_name, {"_id": document["_id"]} if document else query
+        )
+        return document
+
+    """
+    Get a document from the mirror or the cache without querying the database.
+
+    Params
+    ---------
+    @param collection_name (str): Name of the MongoDB collection.
+    @param _id (Any): ID of the document.
+    @param projection (Optional[Dict[str, Union[int, bool]]]): Fields to include/exclude in the result.
+
+    Returns
+    ---------
+    @returns Optional[Dict[str, Any]]: The document, or None if neither holds it.
+    """
+
+    def peek_document(
+        self,
+        collection_name: str,
+        _id: Any,
+        projection: Optional[Dict[str, Union[int, bool]]] = None,
+    ) -> Optional[Dict[str, Any]]:
+        document = self._mirrored(collection_name, _id, projection)
+        if document is None and self.cache is not None:
+            document = self.cache.get(
+                collection_name, _id, _projected_fields(projection)
+            )
+            if document is not None:
+                document = _project(document, projection)
+        return document
 
     """
     Find one document in the specified collection based on the ID.
@@ -176,8 +475,45 @@ class MongoDBUtility:
         _id: str,
         projection: Optional[Dict[str, Union[int, bool]]] = None,
     ) -> Optional[Dict[str, Any]]:
+        document = self._mirrored(collection_name, _id, projection)
+        if document is not None:
+            return document
+        return self._fetch_document_by_id(collection_name, _id, projection)
+
+    """
+    Find one document by ID through the cache, bypassing the mirror.
+
+    Params
+    ---------
+    @param collection_name (str): Name of the MongoDB collection.
+    @param _id (str): ID of the document to be found.
+    @param projection (Optional[Dict[str, Union[int, bool]]]): Fields to include/exclude in the result.
+
+    Returns
+    ---------
+    @returns Optional[Dict[str, Any]]: The document matching the ID, or None if not found.
+    """
+
+    def _fetch_document_by_id(
+        self,
+        collection_name: str,
+        _id: str,
+        projection: Optional[Dict[str, Union[int, bool]]] = None,
+    ) -> Optional[Dict[str, Any]]:
+        fields = _projected_fields(projection)
+        if self.cache is not None:
+            document = self.cache.get(collection_name, _id, fields)
+            if document is not None:
+                return _project(document, projection)
+            token = self.cache.token()
         collection: Collection = self.database[collection_name]
-        return collection.find_one({"_id": _id}, projection)
+        document = collection.find_one({"_id": _id}, projection)
+        if document is not None and self.cache is not None:
+            if projection is None or fields is not None:
+                self.cache.set(
+                    collection_name, document, full=projection is None, token=token
+                )
+        return document
 
     """
     Insert a document into the specified collection if it does not exist.
@@ -199,6 +535,7 @@ class MongoDBUtility:
         result: InsertOneResult = collection.update_one(
             document, {"$setOnInsert": document}, upsert=True
         )
+        self._invalidate(collection_name, document)
         return result.upserted_id
 
     """
@@ -219,3 +556,750 @@ class MongoDBUtility:
         self, collection_name: str, query: Dict[str, Any], update: Dict[str, Any]
     ) -> int:
         collection: Collection = self.database[collection_name]
+        result: UpdateResult = collection.update_one(query, {"$set": update})
+        self._invalidate(collection_name, query)
+        return result.modified_count
+
+    """
+    Update a document in the specified collection only while it matches a condition.
+
+    The condition is part of the update filter, so checking and writing are one
+    atomic operation and concurrent callers cannot both succeed. With a default
+    document, a missing document is inserted from it and updated in the same
+    operation, while an existing one that does not match is left untouched. The
+    written fields are applied to the cached document, so reading them back after
+    a successful update needs no round-trip.
+
+    Params
+    ---------
+    @param collection_name (str): Name of the MongoDB collection.
+    @param _id (Any): ID of the document to be updated.
+    @param condition (Dict[str, Any]): Query the document must match to be updated.
+    @param update (Dict[str, Any]): Update operation to be applied.
+    @param default (Optional[Dict[str, Any]]): Document to insert if none has the ID.
+
+    Returns
+    ---------
+    @returns bool: True if the document matched or was inserted and was updated, False otherwise.
+    """
+
+    def update_document_if_matches(
+        self,
+        collection_name: str,
+        _id: Any,
+        condition: Dict[str, Any],
+        update: Dict[str, Any],
+        default: Optional[Dict[str, Any]] = None,
+    ) -> bool:
+        collection: Collection = self.database[collection_name]
+        token = None if self.cache is None else self.cache.token()
+        operation: Dict[str, Any] = {"$set": update}
+        if default is not None:
+            operation["$setOnInsert"] = {
+                key: value
+                for key, value in default.items()
+                if key != "_id" and key not in update and key not in condition
+            }
+        try:
+            result: UpdateResult = collection.update_one(
+                {**condition, "_id": _id}, operation, upsert=default is not None
+            )
+        except DuplicateKeyError:
+            # The document exists but does not match, so the upsert tried to insert it.
+            return False
+        if not result.matched_count and result.upserted_id is None:
+            return False
+        if token is None or any("." in key for key in update):
+            self._invalidate(collection_name, {"_id": _id})
+            return True
+        if collection_name == self.mirror_collection:
+            self.mirror.invalidate(_id)
+        self.cache.update(collection_name, _id, update, token)
+        return True
+
+    """
+    Run an aggregation pipeline on the specified collection.
+
+    Params
+    ---------
+    @param collection_name (str): Name of the MongoDB collection.
+    @param pipeline (List[Dict[str, Any]]): The aggregation stages.
+
+    Returns
+    ---------
+    @returns List[Dict[str, Any]]: The documents the pipeline outputs.
+    """
+
+    def aggregate(
+        self, collection_name: str, pipeline: List[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        collection: Collection = self.database[collection_name]
+        return list(collection.aggregate(pipeline))
+
+    """
+    Find the IDs of all documents in the specified collection matching the query.
+
+    Only the _id field is projected, so this costs one round-trip regardless of
+    document size.
+
+    Params
+    ---------
+    @param collection_name (str): Name of the MongoDB collection.
+    @param query (Optional[Dict[str, Any]]): Query to filter documents.
+
+    Returns
+    ---------
+    @returns Set[Any]: The IDs of the documents matching the query.
+    """
+
+    def find_document_ids(
+        self, collection_name: str, query: Optional[Dict[str, Any]] = None
+    ) -> Set[Any]:
+        collection: Collection = self.database[collection_name]
+        return {document["_id"] for document in collection.find(query, {"_id": 1})}
+
+    """
+    Insert many documents into the specified collection, skipping any that already exist.
+
+    The documents are sent as a single unordered bulk write of upserts keyed by _id.
+
+    Params
+    ---------
+    @param collection_name (str): Name of the MongoDB collection.
+    @param documents (List[Dict[str, Any]]): Documents to be inserted.
+
+    Returns
+    ---------
+    @returns int: The number of documents inserted.
+    """
+
+    def bulk_insert_documents_if_not_exist(
+        self, collection_name: str, documents: List[Dict[str, Any]]
+    ) -> int:
+        if not documents:
+            return 0
+        collection: Collection = self.database[collection_name]
+        result: BulkWriteResult = collection.bulk_write(
+            [
+                UpdateOne(
+                    {"_id": document["_id"]},
+                    {"$setOnInsert": {k: v for k, v in document.items() if k != "_id"}},
+                    upsert=True,
+                )
+                for document in documents
+            ],
+            ordered=False,
+        )
+        for document in documents:
+            self._invalidate(collection_name, {"_id": document["_id"]})
+        return result.upserted_count
+
+    """
+    Create the given indexes on the specified collection if they do not exist.
+
+    Creating an index that already exists with the same specification is a no-op,
+    so this is safe to call on every startup.
+
+    Params
+    ---------
+    @param collection_name (str): Name of the MongoDB collection.
+    @param indexes (List[IndexModel]): Indexes the collection requires.
+
+    Returns
+    ---------
+    @returns List[str]: The names of the indexes.
+    """
+
+    def ensure_indexes(
+        self, collection_name: str, indexes: List[IndexModel]
+    ) -> List[str]:
+        collection: Collection = self.database[collection_name]
+        return collection.create_indexes(indexes)
+
+    """
+    Explain a query on the specified collection.
+
+    Params
+    ---------
+    @param collection_name (str): Name of the MongoDB collection.
+    @param query (Dict[str, Any]): Query to be explained.
+    @param projection (Optional[Dict[str, Union[int, bool]]]): Fields to include/exclude in the result.
+
+    Returns
+    ---------
+    @returns List[str]: The stages of the winning plan, outermost first.
+    """
+
+    def explain_query(
+        self,
+        collection_name: str,
+        query: Dict[str, Any],
+        projection: Optional[Dict[str, Union[int, bool]]] = None,
+    ) -> List[str]:
+        collection: Collection = self.database[collection_name]
+        explanation = collection.find(query, projection).explain()
+        return _plan_stages(explanation["queryPlanner"]["winningPlan"])
+
+    """
+    Find the queries that would scan the whole specified collection.
+
+    Params
+    ---------
+    @param collection_name (str): Name of the MongoDB collection.
+    @param queries (Dict[str, Dict[str, Any]]): Queries to be checked, by name.
+
+    Returns
+    ---------
+    @returns List[str]: The names of the queries planned as a COLLSCAN.
+    """
+
+    def find_collection_scans(
+        self, collection_name: str, queries: Dict[str, Dict[str, Any]]
+    ) -> List[str]:
+        return [
+            name
+            for name, query in queries.items()
+            if "COLLSCAN" in self.explain_query(collection_name, query)
+        ]
+
+    """
+    Update many documents of the specified collection by ID in one bulk write.
+
+    Params
+    ---------
+    @param collection_name (str): Name of the MongoDB collection.
+    @param updates (Dict[Any, Dict[str, Any]]): Fields to be set, by document ID.
+
+    Returns
+    ---------
+    @returns int: The number of documents modified.
+    """
+
+    def bulk_update_documents(
+        self, collection_name: str, updates: Dict[Any, Dict[str, Any]]
+    ) -> int:
+        if not updates:
+            return 0
+        collection: Collection = self.database[collection_name]
+        result: BulkWriteResult = collection.bulk_write(
+            [
+                UpdateOne({"_id": _id}, {"$set": update})
+                for _id, update in updates.items()
+            ],
+            ordered=False,
+        )
+        for _id in updates:
+            self._invalidate(collection_name, {"_id": _id})
+        return result.modified_count
+
+
+class AsyncMongoDBUtility:
+    """
+    Initialize the AsyncMongoDBUtility, an awaitable wrapper around MongoDBUtility.
+
+    Every call is run on a bounded thread pool so the blocking pymongo driver never
+    stalls the event loop. Updates queued with queue_update are coalesced per _id
+    and written behind in one bulk write; any other write to the same collection
+    flushes them first, so writes still apply in call order.
+
+    Params
+    ---------
+    @param connection (str | MongoClient): MongoDB connection string or MongoClient instance.
+    @param database_name (str): Name of the MongoDB database.
+    @param max_workers (int): Maximum number of concurrent database calls.
+    @param cache (Optional[DocumentCache]): Read-through cache for lookups by _id.
+    @param batch_size (int): Number of queued updates of a collection that triggers a flush.
+    @param flush_interval (float): Seconds a queued update waits at most before it is flushed.
+
+    Returns
+    ---------
+    @returns None: No return value.
+    """
+
+    def __init__(
+        self,
+        connection: str | MongoClient,
+        database_name: str,
+        max_workers: int = 8,
+        cache: Optional[DocumentCache] = None,
+        batch_size: int = 500,
+        flush_interval: float = 1.0,
+    ) -> None:
+        self.sync = MongoDBUtility(connection, database_name, cache)
+        self.client = self.sync.client
+        self.database = self.sync.database
+        self.cache = cache
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="mongo"
+        )
+        self.pending: Dict[str, Dict[Any, Dict[str, Any]]] = defaultdict(dict)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.flush_task: Optional[asyncio.Task] = None
+        self.flush_lock = asyncio.Lock()
+
+    """
+    Run a blocking MongoDBUtility call on the executor.
+
+    Params
+    ---------
+    @param func (Callable[..., Any]): The blocking function to call.
+
+    Returns
+    ---------
+    @returns Any: The return value of the function.
+    """
+
+    async def _run(self, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        with METRICS.track(
+            "mongo_operation",
+            collection=args[0] if args else "",
+            operation=func.__name__,
+        ):
+            return await loop.run_in_executor(
+                self.executor, functools.partial(func, *args, **kwargs)
+            )
+
+    """
+    Run a blocking MongoDBUtility write after flushing the queued updates it touches.
+
+    Only the queued updates of the written IDs are flushed, so unrelated writes do
+    not break up the batch; a write that can match any document flushes them all.
+
+    Params
+    ---------
+    @param func (Callable[..., Any]): The blocking function to call.
+    @param collection_name (str): Name of the MongoDB collection.
+    @param ids (Optional[List[Any]]): IDs of the documents written, or None if unknown.
+
+    Returns
+    ---------
+    @returns Any: The return value of the function.
+    """
+
+    async def _write(
+        self,
+        func: Callable[..., Any],
+        collection_name: str,
+        *args: Any,
+        ids: Optional[List[Any]] = None,
+    ) -> Any:
+        pending = self.pending.get(collection_name)
+        if pending and (ids is None or any(_id in pending for _id in ids)):
+            await self.flush(collection_name, ids)
+        return await self._run(func, collection_name, *args)
+
+    """
+    Apply queued updates to a document read from the specified collection.
+
+    Params
+    ---------
+    @param collection_name (str): Name of the MongoDB collection.
+    @param document (Optional[Dict[str, Any]]): The document read.
+    @param projection (Optional[Dict[str, Union[int, bool]]]): Projection the document was read with.
+
+    Returns
+    ---------
+    @returns Optional[Dict[str, Any]]: The document as it will be once flushed.
+    """
+
+    def _overlay(
+        self,
+        collection_name: str,
+        document: Optional[Dict[str, Any]],
+        projection: Optional[Dict[str, Union[int, bool]]],
+    ) -> Optional[Dict[str, Any]]:
+        if document is None:
+            return None
+        update = self.pending.get(collection_name, {}).get(document["_id"])
+        if update:
+            document.update(_project(update, projection))
+        return document
+
+    """
+    Queue an update of one document to be written behind in a batch.
+
+    Later updates to the same _id are merged into the queued one. Use update_document
+    instead when the write must be durable before continuing.
+
+    Params
+    ---------
+    @param collection_name (str): Name of the MongoDB collection.
+    @param _id (Any): ID of the document to be updated.
+    @param update (Dict[str, Any]): Fields to be set.
+
+    Returns
+    ---------
+    @returns None: No return value.
+    """
+
+    async def queue_update(
+        self, collection_name: str, _id: Any, update: Dict[str, Any]
+    ) -> None:
+        pending = self.pending[collection_name]
+        pending.setdefault(_id, {}).update(update)
+        if len(pending) >= self.batch_size:
+            await self.flush(collection_name)
+        elif self.flush_task is None or self.flush_task.done():
+            self.flush_task = asyncio.create_task(self._flush_later())
+
+    """
+    Flush the queued updates after the flush interval.
+
+    Returns
+    ---------
+    @returns None: No return value.
+    """
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(self.flush_interval)
+        self.flush_task = None
+        try:
+            await self.flush()
+        except Exception:
+            logger.exception("Failed to flush queued updates")
+            if self.flush_task is None:
+                self.flush_task = asyncio.create_task(self._flush_later())
+
+    """
+    Write the queued updates as one bulk write per collection.
+
+    Updates that fail to be written are queued again, under any newer update.
+
+    Params
+    ---------
+    @param collection_name (Optional[str]): Collection to flush, or None for all.
+    @param ids (Optional[List[Any]]): IDs whose updates to flush, or None for all.
+
+    Returns
+    ---------
+    @returns int: The number of documents modified.
+    """
+
+    async def flush(
+        self, collection_name: Optional[str] = None, ids: Optional[List[Any]] = None
+    ) -> int:
+        async with self.flush_lock:
+            modified = 0
+            names = list(self.pending) if collection_name is None else [collection_name]
+            for name in names:
+                if ids is None:
+                    updates = self.pending.pop(name, None)
+                else:
+                    pending = self.pending.get(name, {})
+                    updates = {_id: pending.pop(_id) for _id in ids if _id in pending}
+                if not updates:
+                    continue
+                try:
+                    modified += await self._run(
+                        self.sync.bulk_update_documents, name, updates
+                    )
+                except Exception:
+                    pending = self.pending[name]
+                    for _id, update in updates.items():
+                        pending[_id] = {**update, **pending.get(_id, {})}
+                    raise
+            return modified
+
+    """
+    Awaitable variant of MongoDBUtility.insert_document.
+    """
+
+    async def insert_document(
+        self, collection_name: str, document: Dict[str, Any]
+    ) -> Any:
+        return await self._write(
+            self.sync.insert_document,
+            collection_name,
+            document,
+            ids=_document_ids([document]),
+        )
+
+    """
+    Awaitable variant of MongoDBUtility.find_documents.
+    """
+
+    async def find_documents(
+        self,
+        collection_name: str,
+        query: Optional[Dict[str, Any]] = None,
+        projection: Optional[Dict[str, Union[int, bool]]] = None,
+    ) -> List[Dict[str, Any]]:
+        return await self._run(
+            self.sync.find_documents, collection_name, query, projection
+        )
+
+    """
+    Awaitable variant of MongoDBUtility.find_one_document.
+    """
+
+    async def find_one_document(
+        self,
+        collection_name: str,
+        query: Optional[Dict[str, Any]] = None,
+        projection: Optional[Dict[str, Union[int, bool]]] = None,
+    ) -> Optional[Dict[str, Any]]:
+        _id = _query_id(query)
+        if _id is not None and len(query) == 1:
+            return await self.find_document_by_id(collection_name, _id, projection)
+        document = await self._run(
+            self.sync.find_one_document, collection_name, query, projection
+        )
+        return self._overlay(collection_name, document, projection)
+
+    """
+    Awaitable variant of MongoDBUtility.update_document.
+    """
+
+    async def update_document(
+        self, collection_name: str, query: Dict[str, Any], update: Dict[str, Any]
+    ) -> int:
+        return await self._write(
+            self.sync.update_document,
+            collection_name,
+            query,
+            update,
+            ids=_query_ids(query),
+        )
+
+    """
+    Awaitable variant of MongoDBUtility.update_documents.
+    """
+
+    async def update_documents(
+        self, collection_name: str, query: Dict[str, Any], update: Dict[str, Any]
+    ) -> int:
+        return await self._write(
+            self.sync.update_documents,
+            collection_name,
+            query,
+            update,
+            ids=_query_ids(query),
+        )
+
+    """
+    Awaitable variant of MongoDBUtility.delete_document.
+    """
+
+    async def delete_document(self, collection_name: str, query: Dict[str, Any]) -> int:
+        return await self._write(
+            self.sync.delete_document, collection_name, query, ids=_query_ids(query)
+        )
+
+    """
+    Awaitable variant of MongoDBUtility.delete_documents.
+    """
+
+    async def delete_documents(
+        self, collection_name: str, query: Dict[str, Any]
+    ) -> int:
+        return await self._write(
+            self.sync.delete_documents, collection_name, query, ids=_query_ids(query)
+        )
+
+    """
+    Awaitable variant of MongoDBUtility.find_document_and_update.
+    """
+
+    async def find_document_and_update(
+        self, collection_name: str, query: Dict[str, Any], update: Dict[str, Any]
+    ) -> Optional[Dict[str, Any]]:
+        return await self._write(
+            self.sync.find_document_and_update,
+            collection_name,
+            query,
+            update,
+            ids=_query_ids(query),
+        )
+
+    """
+    Awaitable variant of MongoDBUtility.find_document_by_id.
+    """
+
+    async def find_document_by_id(
+        self,
+        collection_name: str,
+        _id: str,
+        projection: Optional[Dict[str, Union[int, bool]]] = None,
+    ) -> Optional[Dict[str, Any]]:
+        # Mirrored documents are read on the loop, without a trip to the executor.
+        document = self.sync._mirrored(collection_name, _id, projection)
+        if document is None:
+            document = await self._run(
+                self.sync._fetch_document_by_id, collection_name, _id, projection
+            )
+        return self._overlay(collection_name, document, projection)
+
+    """
+    Variant of MongoDBUtility.peek_document that includes queued updates.
+
+    It never leaves the process, so it runs on the loop.
+    """
+
+    async def peek_document(
+        self,
+        collection_name: str,
+        _id: Any,
+        projection: Optional[Dict[str, Union[int, bool]]] = None,
+    ) -> Optional[Dict[str, Any]]:
+        document = self.sync.peek_document(collection_name, _id, projection)
+        return self._overlay(collection_name, document, projection)
+
+    """
+    Awaitable variant of MongoDBUtility.insert_document_if_not_exists.
+    """
+
+    async def insert_document_if_not_exists(
+        self, collection_name: str, document: Dict[str, Any]
+    ) -> Any:
+        return await self._write(
+            self.sync.insert_document_if_not_exists,
+            collection_name,
+            document,
+            ids=_document_ids([document]),
+        )
+
+    """
+    Awaitable variant of MongoDBUtility.update_document_if_exists.
+    """
+
+    async def update_document_if_exists(
+        self, collection_name: str, query: Dict[str, Any], update: Dict[str, Any]
+    ) -> int:
+        return await self._write(
+            self.sync.update_document_if_exists,
+            collection_name,
+            query,
+            update,
+            ids=_query_ids(query),
+        )
+
+    """
+    Awaitable variant of MongoDBUtility.update_document_if_matches.
+    """
+
+    async def update_document_if_matches(
+        self,
+        collection_name: str,
+        _id: Any,
+        condition: Dict[str, Any],
+        update: Dict[str, Any],
+        default: Optional[Dict[str, Any]] = None,
+    ) -> bool:
+        return await self._write(
+            self.sync.update_document_if_matches,
+            collection_name,
+            _id,
+            condition,
+            update,
+            default,
+            ids=[_id],
+        )
+
+    """
+    Awaitable variant of MongoDBUtility.aggregate.
+    """
+
+    async def aggregate(
+        self, collection_name: str, pipeline: List[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        return await self._run(self.sync.aggregate, collection_name, pipeline)
+
+    """
+    Awaitable variant of MongoDBUtility.find_document_ids that includes queued updates.
+
+    For a query of plain field values, queued updates setting every queried field
+    decide whether their document matches without being written; those setting only
+    some are written first. Queued updates are written first for any other query.
+    """
+
+    async def find_document_ids(
+        self, collection_name: str, query: Optional[Dict[str, Any]] = None
+    ) -> Set[Any]:
+        pending = self.pending.get(collection_name, {})
+        if not query or not pending:
+            return await self._run(self.sync.find_document_ids, collection_name, query)
+        if any(
+            key.startswith("$") or isinstance(value, dict)
+            for key, value in query.items()
+        ):
+            return await self._write(
+                self.sync.find_document_ids, collection_name, query
+            )
+        partial = [
+            _id
+            for _id, update in pending.items()
+            if any(key in update for key in query)
+            and not all(key in update for key in query)
+        ]
+        if partial:
+            await self.flush(collection_name, partial)
+        ids = await self._run(self.sync.find_document_ids, collection_name, query)
+        for _id, update in self.pending.get(collection_name, {}).items():
+            if all(key in update for key in query):
+                if all(update[key] == value for key, value in query.items()):
+                    ids.add(_id)
+                else:
+                    ids.discard(_id)
+        return ids
+
+    """
+    Awaitable variant of MongoDBUtility.bulk_insert_documents_if_not_exist.
+    """
+
+    async def bulk_insert_documents_if_not_exist(
+        self, collection_name: str, documents: List[Dict[str, Any]]
+    ) -> int:
+        return await self._write(
+            self.sync.bulk_insert_documents_if_not_exist,
+            collection_name,
+            documents,
+            ids=_document_ids(documents),
+        )
+
+    """
+    Awaitable variant of MongoDBUtility.ensure_indexes.
+    """
+
+    async def ensure_indexes(
+        self, collection_name: str, indexes: List[IndexModel]
+    ) -> List[str]:
+        return await self._run(self.sync.ensure_indexes, collection_name, indexes)
+
+    """
+    Awaitable variant of MongoDBUtility.explain_query.
+    """
+
+    async def explain_query(
+        self,
+        collection_name: str,
+        query: Dict[str, Any],
+        projection: Optional[Dict[str, Union[int, bool]]] = None,
+    ) -> List[str]:
+        return await self._run(
+            self.sync.explain_query, collection_name, query, projection
+        )
+
+    """
+    Awaitable variant of MongoDBUtility.find_collection_scans.
+    """
+
+    async def find_collection_scans(
+        self, collection_name: str, queries: Dict[str, Dict[str, Any]]
+    ) -> List[str]:
+        return await self._run(
+            self.sync.find_collection_scans, collection_name, queries
+        )
+
+    """
+    Wait for pending calls to finish and close the underlying client.
+
+    Returns
+    ---------
+    @returns None: No return value.
+    """
+
+    def close(self) -> None:
+        self.executor.shutdown(wait=True)
+        self.client.close()
@@ -0,0 +1,289 @@
+"""
+Copyright (c) 2023 Combo Gang. All rights reserved.
+
+This work is licensed under the terms of the MIT license.  
+For a copy, see <https://opensource.org/licenses/MIT>.
+"""
+import asyncio
+import bisect
+import functools
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Tuple
+from aiohttp import web
+from loguru import logger
+
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    """
+    Initialize the Histogram, a fixed-bucket latency histogram.
+
+    Params
+    ---------
+    @param buckets (Tuple[float, ...]): Upper bounds of the buckets in seconds.
+
+    Returns
+    ---------
+    @returns None: No return value.
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = BUCKETS) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        """Records one observation
+
+        Params
+        ---------
+        @param value (float): The observed value in seconds.
+        """
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """Estimates a quantile from the buckets
+
+        Params
+        ---------
+        @param q (float): The quantile between 0 and 1.
+
+        Returns
+        ---------
+        @returns float: The upper bound of the bucket holding the quantile.
+        """
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+
+class Metrics:
+    """
+    Initialize the Metrics registry of latency histograms, in-flight counts and gauges.
+
+    Everything is updated from the event loop thread, so no locking is needed.
+
+    Params
+    ---------
+    @param namespace (str): Prefix of every exported metric name.
+
+    Returns
+    ---------
+    @returns None: No return value.
+    """
+
+    def __init__(self, namespace: str = "combo") -> None:
+        self.namespace = namespace
+        self.histograms: Dict[str, Dict[Labels, Histogram]] = defaultdict(dict)
+        self.in_flight: Dict[str, Dict[Labels, int]] = defaultdict(
+            lambda: defaultdict(int)
+        )
+        self.gauges: Dict[str, Callable[[], Dict[str, float]]] = {}
+
+    def observe(self, name: str, seconds: float, **labels: str) -> None:
+        """Records a latency
+
+        Params
+        ---------
+        @param name (str): The metric name.
+        @param seconds (float): The latency in seconds.
+        @param labels (str): The labels of the series.
+        """
+        key = tuple(sorted(labels.items()))
+        histogram = self.histograms[name].get(key)
+        if histogram is None:
+            histogram = self.histograms[name][key] = Histogram()
+        histogram.observe(seconds)
+
+    @contextmanager
+    def track(self, name: str, **labels: str) -> Iterator[None]:
+        """Times a block and counts it as in flight while it runs
+
+        Params
+        ---------
+        @param name (str): The metric name.
+        @param labels (str): The labels of the series.
+        """
+        key = tuple(sorted(labels.items()))
+        self.in_flight[name][key] += 1
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.in_flight[name][key] -= 1
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def timed(
+        self, name: str, **labels: str
+    ) -> Callable[[Callable[..., Awaitable[Any]]], Callable[..., Awaitable[Any]]]:
+        """Decorates a coroutine function so every call is tracked
+
+        The handler label defaults to the qualified name of the function.
+
+        Params
+        ---------
+        @param name (str): The metric name.
+        @param labels (str): The labels of the series.
+
+        Returns
+        ---------
+        @returns Callable: The decorator.
+        """
+
+        def decorator(func: Callable[..., Awaitable[Any]]):
+            series = {"handler": func.__qualname__, **labels}
+
+            @functools.wraps(func)
+            async def wrapper(*args: Any, **kwargs: Any) -> Any:
+                with self.track(name, **series):
+                    return await func(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def register_gauge(self, name: str, callback: Callable[[], Dict[str, float]]):
+        """Registers counters read when the metrics are exported
+
+        Params
+        ---------
+        @param name (str): The metric name.
+        @param callback (Callable[[], Dict[str, float]]): Returns the values by key.
+        """
+        self.gauges[name] = callback
+
+    def render(self) -> str:
+        """Renders every metric in the Prometheus text format
+
+        Returns
+        ---------
+        @returns str: The exposition text.
+        """
+        lines: List[str] = []
+        for name, series in self.histograms.items():
+            metric = f"{self.namespace}_{name}_seconds"
+            lines.append(f"# TYPE {metric} histogram")
+            for key, histogram in series.items():
+                cumulative = 0
+                for bound, count in zip(
+                    histogram.buckets + (float("inf"),), histogram.counts
+                ):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(
+                        f"{metric}_bucket{_labels(key + (('le', le),))} {cumulative}"
+                    )
+                lines.append(f"{metric}_sum{_labels(key)} {histogram.sum}")
+                lines.append(f"{metric}_count{_labels(key)} {histogram.count}")
+        for name, series in self.in_flight.items():
+            metric = f"{self.namespace}_{name}_in_flight"
+            lines.append(f"# TYPE {metric} gauge")
+            for key, value in series.items():
+                lines.append(f"{metric}{_labels(key)} {value}")
+        for name, callback in self.gauges.items():
+            metric = f"{self.namespace}_{name}"
+            lines.append(f"# TYPE {metric} gauge")
+            for key, value in callback().items():
+                lines.append(f"{metric}{_labels((('key', key),))} {value}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> str:
+        """Summarizes every histogram on one line each for the log
+
+        Returns
+        ---------
+        @returns str: The summary.
+        """
+        lines = []
+        for name, series in self.histograms.items():
+            for key, histogram in series.items():
+                lines.append(
+                    f"{name}{_labels(key)} count={histogram.count} "
+                    f"mean={histogram.sum / histogram.count * 1000:.1f}ms "
+                    f"p50<={histogram.quantile(0.5) * 1000:g}ms "
+                    f"p99<={histogram.quantile(0.99) * 1000:g}ms"
+                )
+        return "\n".join(lines)
+
+    async def serve(self, host: str, port: int) -> web.AppRunner:
+        """Serves the metrics on http://host:port/metrics
+
+        Params
+        ---------
+        @param host (str): The interface to bind.
+        @param port (int): The port to bind.
+
+        Returns
+        ---------
+        @returns web.AppRunner: The runner, to be cleaned up on shutdown.
+        """
+
+        async def handler(request: web.Request) -> web.Response:
+            return web.Response(text=self.render(), content_type="text/plain")
+
+        app = web.Application()
+        app.router.add_get("/metrics", handler)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        logger.info(f"Serving metrics on http://{host}:{port}/metrics")
+        return runner
+
+    async def log_periodically(self, interval: float) -> None:
+        """Writes the summary to the log forever
+
+        Params
+        ---------
+        @param interval (float): Seconds between two summaries.
+        """
+        while True:
+            await asyncio.sleep(interval)
+            summary = self.summary()
+            if summary:
+                logger.info(f"Metrics\n{summary}")
+
+
+def _labels(key: Labels) -> str:
+    """Formats labels for the exposition text
+
+    Params
+    ---------
+    @param key (Labels): The label pairs.
+
+    Returns
+    ---------
+    @returns str: The formatted labels, or an empty string without labels.
+    """
+    if not key:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in key)
+    return "{" + pairs + "}"
+
+
+def _escape(value: Any) -> str:
+    """Escapes a label value for the exposition text
+
+    Params
+    ---------
+    @param value (Any): The label value.
+
+    Returns
+    ---------
+    @returns str: The escaped value.
+    """
+    return str(value).replace("\\", "\\\\").replace('"', '\\"')
+
+
+METRICS = Metrics()
@@ -0,0 +1,187 @@
+"""
+Copyright (c) 2023 Combo Gang. All rights reserved.
+
+This work is licensed under the terms of the MIT license.  
+For a copy, see <https://opensource.org/licenses/MIT>.
+"""
+from threading import Event, Lock, Thread
+from typing import Optional, Dict, Any, Set
+from loguru import logger
+from pymongo.collection import Collection
+from pymongo.errors import OperationFailure, PyMongoError
+
+# Server error codes meaning the deployment has no change streams at all:
+# CommandNotSupported, an unrecognized pipeline stage and a standalone server.
+UNSUPPORTED_CODES = {115, 40324, 40573}
+
+
+class LocalMirror:
+    """
+    Initialize the LocalMirror, an in-memory copy of one collection indexed by _id.
+
+    The mirror is filled with one bulk read and kept current by following the
+    collection's change stream on its own thread. Deployments without change
+    streams fall back to reloading the whole collection periodically. Reads served
+    from the mirror never leave the process, so they keep working during short
+    cluster outages.
+
+    Params
+    ---------
+    @param collection (Collection): The mirrored collection.
+    @param refresh_interval (float): Seconds between reloads when change streams are unavailable.
+    @param change_streams (bool): Whether to follow the change stream, or only reload.
+
+    Returns
+    ---------
+    @returns None: No return value.
+    """
+
+    def __init__(
+        self,
+        collection: Collection,
+        refresh_interval: float = 60,
+        change_streams: bool = True,
+    ) -> None:
+        self.collection = collection
+        self.refresh_interval = refresh_interval
+        self.change_streams = change_streams
+        self.documents: Dict[Any, Dict[str, Any]] = {}
+        self.lock = Lock()
+        self.stopped = Event()
+        self.ready = False
+        self.loading = False
+        self.invalidated: Set[Any] = set()
+        self.hits = 0
+        self.misses = 0
+
+    def load(self) -> int:
+        """Replaces the mirror with the current content of the collection
+
+        Documents invalidated while the collection is read may predate the write
+        that invalidated them, so they are left out of the new mirror.
+
+        Returns
+        ---------
+        @returns int: The number of documents mirrored.
+        """
+        with self.lock:
+            self.loading = True
+            self.invalidated.clear()
+        try:
+            documents = {
+                document["_id"]: document for document in self.collection.find()
+            }
+            with self.lock:
+                for _id in self.invalidated:
+                    documents.pop(_id, None)
+                self.documents = documents
+                self.ready = True
+        finally:
+            with self.lock:
+                self.loading = False
+                self.invalidated.clear()
+        return len(documents)
+
+    def get(self, _id: Any) -> Optional[Dict[str, Any]]:
+        """Gets a mirrored document
+
+        Params
+        ---------
+        @param _id (Any): ID of the document.
+
+        Returns
+        ---------
+        @returns Optional[Dict[str, Any]]: A copy of the document, or None if it is not mirrored.
+        """
+        with self.lock:
+            document = self.documents.get(_id)
+            if document is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return dict(document)
+
+    def invalidate(self, _id: Any) -> None:
+        """Drops a document until the change stream delivers its new version
+
+        Params
+        ---------
+        @param _id (Any): ID of the document.
+        """
+        with self.lock:
+            self.documents.pop(_id, None)
+            if self.loading:
+                self.invalidated.add(_id)
+
+    def apply(self, change: Dict[str, Any]) -> None:
+        """Applies one change stream event
+
+        Params
+        ---------
+        @param change (Dict[str, Any]): The change event.
+        """
+        _id = change.get("documentKey", {}).get("_id")
+        document = change.get("fullDocument")
+        with self.lock:
+            if change["operationType"] == "delete" or document is None:
+                self.documents.pop(_id, None)
+            else:
+                self.documents[_id] = document
+
+    def start(self) -> None:
+        """Loads the mirror and starts following changes on a daemon thread"""
+        target = self._follow if self.change_streams else self._poll
+        Thread(target=target, name="mongo-mirror", daemon=True).start()
+
+    def stop(self) -> None:
+        """Stops following changes"""
+        self.stopped.set()
+
+    def stats(self) -> Dict[str, int]:
+        """Gets the mirror counters
+
+        Returns
+        ---------
+        @returns Dict[str, int]: The hit, miss and size counters.
+        """
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self.documents),
+            }
+
+    def _follow(self) -> None:
+        while not self.stopped.is_set():
+            try:
+                # The stream is opened before loading, so no change is missed in between.
+                with self.collection.watch(full_document="updateLookup") as stream:
+                    logger.info(f"Mirrored {self.load()} documents")
+                    while not self.stopped.is_set() and stream.alive:
+                        change = stream.try_next()
+                        if change is not None:
+                            self.apply(change)
+            except (OperationFailure, NotImplementedError) as error:
+                if (
+                    isinstance(error, OperationFailure)
+                    and error.code not in UNSUPPORTED_CODES
+                ):
+                    # Reopening reloads, which also recovers from a lost resume point.
+                    logger.exception("Change stream failed, reopening it")
+                    self.stopped.wait(1)
+                    continue
+                logger.warning(
+                    f"Change streams unsupported, reloading instead: {error}"
+                )
+                self._poll()
+            except PyMongoError:
+                logger.exception("Change stream failed, reopening it")
+                self.stopped.wait(1)
+
+    def _poll(self) -> None:
+        while not self.stopped.is_set():
+            try:
+                self.load()
+            except PyMongoError:
+                logger.exception("Failed to reload the mirror")
+            self.stopped.wait(self.refresh_interval)
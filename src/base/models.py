@@ -0,0 +1,167 @@
+"""
+Copyright (c) 2023 Combo Gang. All rights reserved.
+
+This work is licensed under the terms of the MIT license.  
+For a copy, see <https://opensource.org/licenses/MIT>.
+"""
+from datetime import datetime
+from enum import Enum
+from pymongo import ASCENDING, IndexModel
+from typing import Optional, Dict, Any, List
+
+
+class Projections(Enum):
+    """Projections of ComboData documents for each use case"""
+
+    VERIFICATION = {"verified": 1}
+    PUNISHMENTS = {"ban_time": 1, "mute_time": 1}
+    NUDGE = {"nudged": 1}
+
+
+class Queries(Enum):
+    """Queries the bot runs against ComboData, checked for collection scans"""
+
+    ACTIVE_PUNISHMENTS = {"$or": [{"ban_time": {"$gt": 0}}, {"mute_time": {"$gt": 0}}]}
+    NUDGED = {"nudged": True}
+    UNVERIFIED = {"verified": False}
+
+
+class Pipelines(Enum):
+    """Aggregation pipelines the bot runs against ComboData"""
+
+    MEMBER_STATS = [
+        {
+            "$group": {
+                "_id": None,
+                "documents": {"$sum": 1},
+                "verified": {"$sum": {"$cond": ["$verified", 1, 0]}},
+                "punished": {
+                    "$sum": {
+                        "$add": [
+                            {"$cond": [{"$gt": ["$ban_time", 0]}, 1, 0]},
+                            {"$cond": [{"$gt": ["$mute_time", 0]}, 1, 0]},
+                        ]
+                    }
+                },
+            }
+        }
+    ]
+
+
+INDEXES: Dict[str, List[IndexModel]] = {
+    "ComboData": [
+        IndexModel(
+            [("ban_time", ASCENDING)],
+            name="active_bans",
+            partialFilterExpression={"ban_time": {"$gt": 0}},
+        ),
+        IndexModel(
+            [("mute_time", ASCENDING)],
+            name="active_mutes",
+            partialFilterExpression={"mute_time": {"$gt": 0}},
+        ),
+        IndexModel(
+            [("verified", ASCENDING)],
+            name="unverified",
+            partialFilterExpression={"verified": False},
+        ),
+        IndexModel(
+            [("nudged", ASCENDING)],
+            name="nudged",
+            partialFilterExpression={"nudged": True},
+        ),
+    ]
+}
+
+
+class MemberRecord:
+    """
+    Initialize the MemberRecord, a compact view of a ComboData document.
+
+    Fields missing from a projected document keep their default value. Records
+    build new documents and carry bulk reads such as the punishment reload; the
+    document cache and the mirror keep plain documents, so single lookups read
+    their fields directly instead of building a record.
+
+    Params
+    ---------
+    @param id (int): The Discord ID of the member, stored as _id.
+
+    Returns
+    ---------
+    @returns None: No return value.
+    """
+
+    __slots__ = (
+        "id",
+        "username",
+        "joined_at",
+        "verified",
+        "verified_at",
+        "bot",
+        "ban_time",
+        "mute_time",
+        "blacklisted",
+        "warns",
+        "punishments",
+        "nudged",
+    )
+
+    def __init__(
+        self,
+        id: int,
+        username: Optional[str] = None,
+        joined_at: Optional[datetime] = None,
+        verified: bool = False,
+        verified_at: Optional[datetime] = None,
+        bot: bool = False,
+        ban_time: float = 0,
+        mute_time: float = 0,
+        blacklisted: bool = False,
+        warns: Optional[Dict[str, Any]] = None,
+        punishments: Optional[Dict[str, Any]] = None,
+        nudged: bool = False,
+    ) -> None:
+        self.id = id
+        self.username = username
+        self.joined_at = joined_at
+        self.verified = verified
+        self.verified_at = verified_at
+        self.bot = bot
+        self.ban_time = ban_time
+        self.mute_time = mute_time
+        self.blacklisted = blacklisted
+        self.warns = {} if warns is None else warns
+        self.punishments = {} if punishments is None else punishments
+        self.nudged = nudged
+
+    @classmethod
+    def from_document(cls, document: Dict[str, Any]) -> "MemberRecord":
+        """Builds a record from a full or projected ComboData document
+
+        Params
+        ---------
+        @param document (Dict[str, Any]): The document read from the database.
+
+        Returns
+        ---------
+        @returns MemberRecord: The record.
+        """
+        fields = {
+            field: document[field] for field in cls.__slots__[1:] if field in document
+        }
+        return cls(document["_id"], **fields)
+
+    def to_document(self) -> Dict[str, Any]:
+        """Converts the record to a ComboData document
+
+        Returns
+        ---------
+        @returns Dict[str, Any]: The document to be written.
+        """
+        document = {"_id": self.id}
+        document.update({field: getattr(self, field) for field in self.__slots__[1:]})
+        return document
+
+    def __repr__(self) -> str:
+        return f"<MemberRecord id={self.id} verified={self.verified}>"
@@ -5,88 +5,399 @@ This work is licensed under the terms of the MIT license.
 For a copy, see <https://opensource.org/licenses/MIT>.
 """
 import os
+import json
+import time
 import asyncio
-from discord import Intents, Activity, ActivityType, utils
+import hashlib
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+from discord import (
+    Guild,
+    Intents,
+    Member,
+    MemberCacheFlags,
+    utils,
+)
 from loguru import logger
-from discord.ext.commands import Bot
-from cogwatch import watch
+from discord.app_commands import CommandTree
+from discord.ext.commands import AutoShardedBot, ExtensionError
+from watchfiles import awatch
 from src.base import config
+from src.base.metrics import METRICS
+from src.base.models import INDEXES, MemberRecord
+from src.bot.executor import ActionExecutor
+from src.bot.membership import MembershipPipeline
+from src.bot.scheduler import PunishmentScheduler, TimerHeap
+from src.bot.stats import StatsService
+from src.bot.watchdog import LoopWatchdog
 from datetime import datetime
+from typing import Any, DefaultDict, Iterator, List, Optional, Tuple
 
+COGS_PATH = os.path.join(os.path.dirname(__file__), "cogs")
+COGS_PACKAGE = f"{__package__}.cogs"
 
-class ComboBot(Bot):
-    """Main bot class"""
 
-    def __init__(self):
-        super().__init__(command_prefix="!", intents=Intents.all())
+def member_document(member: Member) -> dict:
+    """Builds the default ComboData document for a member
+
+    Arguments
+    ---------
+    member (discord.Member): The member to build the document for
+
+    Returns
+    -------
+    dict: The document to be inserted
+    """
+    return MemberRecord(
+        member.id,
+        username=member.name,
+        joined_at=member.joined_at,
+        verified=member.bot,
+        verified_at=datetime.now() if member.bot else None,
+        bot=member.bot,
+    ).to_document()
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    """Times a startup or shutdown phase, logging and recording how long it took
+
+    Arguments
+    ---------
+    name (str): The name of the phase
+    """
+    start = time.perf_counter()
+    with METRICS.track("lifecycle_phase", phase=name):
+        yield
+    logger.info(f"Phase {name} took {time.perf_counter() - start:.2f}s")
+
+
+def cog_names() -> List[str]:
+    """Gets the names of the cogs in the cogs package
+
+    Returns
+    -------
+    List[str]: The module names of the cogs
+    """
+    return sorted(
+        filename[:-3]
+        for filename in os.listdir(COGS_PATH)
+        if filename.endswith(".py") and not filename.startswith("_")
+    )
+
+
+def command_tree_hash(tree: CommandTree, application_id: Optional[int]) -> str:
+    """Hashes the signatures of the global app commands as Discord receives them
+
+    Arguments
+    ---------
+    tree (discord.app_commands.CommandTree): The command tree
+    application_id (Optional[int]): The application the commands belong to
+
+    Returns
+    -------
+    str: The hex digest of the commands
+    """
+    payload = {
+        "application_id": application_id,
+        "commands": [command.to_dict() for command in tree.get_commands()],
+    }
+    encoded = json.dumps(payload, sort_keys=True, default=str).encode()
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def lean_intents() -> Tuple[Intents, MemberCacheFlags]:
+    """Gets the only intents the cogs use and a policy caching no members
+
+    Returns
+    -------
+    Tuple[Intents, MemberCacheFlags]: The intents and the member cache policy
+    """
+    return Intents(guilds=True, members=True), MemberCacheFlags.none()
+
+
+class ComboBot(AutoShardedBot):
+    """Main bot class
+
+    In lean mode (config.LEAN_MODE) only the guilds and members intents are
+    requested, no member is cached and guilds are not chunked at startup, so
+    members are enumerated with paginated fetches instead.
+
+    Arguments
+    ---------
+    shard_ids (Optional[List[int]]): The shards this process runs, or None for all
+    shard_count (Optional[int]): The total number of shards, or None for Discord's recommendation
+    metrics_port (Optional[int]): The port the metrics are served on, or None for config.METRICS_PORT
+    """
+
+    def __init__(
+        self,
+        shard_ids: Optional[List[int]] = None,
+        shard_count: Optional[int] = None,
+        metrics_port: Optional[int] = None,
+    ):
+        self.lean = config.LEAN_MODE
+        self.started_at = time.perf_counter()
+        self.closing = False
+        if self.lean:
+            intents, member_cache_flags = lean_intents()
+        else:
+            intents = Intents.all()
+            member_cache_flags = MemberCacheFlags.from_intents(intents)
+        super().__init__(
+            command_prefix="!",
+            intents=intents,
+            member_cache_flags=member_cache_flags,
+            chunk_guilds_at_startup=not self.lean,
+            shard_ids=shard_ids,
+            shard_count=shard_count,
+        )
+        self.actions = ActionExecutor()
+        self.membership = MembershipPipeline(self.actions)
+        self.stats = StatsService(self, config.PRESENCE_INTERVAL)
+        self.punishments = PunishmentScheduler(self)
+        self.view_expiry = TimerHeap()
+        self.reconciled: DefaultDict[int, asyncio.Event] = defaultdict(asyncio.Event)
+        self.metrics_port = (
+            config.METRICS_PORT if metrics_port is None else metrics_port
+        )
+        self.metrics_runner = None
+        self.cog_watcher: Optional[asyncio.Task] = None
+        self.watchdog = (
+            LoopWatchdog(config.WATCHDOG_THRESHOLD, log_path=config.WATCHDOG_LOG_PATH)
+            if config.WATCHDOG_ENABLED
+            else None
+        )
 
     async def load_cogs(self):
-        """Loads all the cogs from the ./src/bot/cogs folder"""
-        for filename in os.listdir("./src/bot/cogs"):
-            if filename.endswith(".py"):
-                await self.load_extension(f"src.bot.cogs.{filename[:-3]}")
-                logger.info(f"Loaded cog {filename[:-3]}")
-
-    async def update_db(self):
-        """Updates the database with all the new data"""
-        for guild in self.guilds:
-            for member in guild.members:
-                if not config.DATABASE.find_one_document(
-                    "ComboData", {"_id": member.id}
-                ):
-                    config.DATABASE.insert_document(
-                        "ComboData",
-                        {
-                            "_id": member.id,
-                            "username": member.name,
-                            "joined_at": member.joined_at,
-                            "verified": member.bot,
-                            "verified_at": datetime.now() if member.bot else None,
-                            "bot": member.bot,
-                            "ban_time": 0,
-                            "mute_time": 0,
-                            "blacklisted": False,
-                            "warns": {},
-                            "punishments": {},
-                            "nudged": False,
-                        },
-                    )
-                    logger.info(f"Added {member.name} to the database")
+        """Loads all the cogs of the cogs package concurrently"""
+        names = cog_names()
+        await asyncio.gather(
+            *(self.load_extension(f"{COGS_PACKAGE}.{name}") for name in names)
+        )
+        logger.info(f"Loaded cogs {', '.join(names)}")
+
+    async def sync_commands(self) -> bool:
+        """Syncs the command tree, unless it matches the last synced one
+
+        The hash of the last synced tree is stored in config.COMMAND_HASH_PATH, so
+        restarts without command changes skip the rate limited sync.
+
+        Returns
+        -------
+        bool: True if the tree was synced
+        """
+        digest = command_tree_hash(self.tree, self.application_id)
+        try:
+            with open(config.COMMAND_HASH_PATH, "r") as file:
+                if file.read() == digest:
+                    logger.info("Command tree unchanged, skipping sync")
+                    return False
+        except FileNotFoundError:
+            pass
+        await self.tree.sync()
+        with open(config.COMMAND_HASH_PATH, "w") as file:
+            file.write(digest)
+        logger.info("Command tree synced")
+        return True
+
+    async def watch_cogs(self):
+        """Reloads the cogs whose files change, syncing commands only if they changed"""
+        async for changes in awatch(COGS_PATH):
+            names = {
+                os.path.basename(path)[:-3]
+                for _, path in changes
+                if path.endswith(".py")
+            }
+            for name in sorted(names):
+                extension = f"{COGS_PACKAGE}.{name}"
+                exists = os.path.exists(os.path.join(COGS_PATH, f"{name}.py"))
+                try:
+                    if extension in self.extensions and not exists:
+                        await self.unload_extension(extension)
+                    elif extension in self.extensions:
+                        await self.reload_extension(extension)
+                    elif exists:
+                        await self.load_extension(extension)
+                    else:
+                        continue
+                except ExtensionError:
+                    logger.exception(f"Failed to reload cog {name}")
+                    continue
+                logger.info(f"Applied changes to cog {name}")
+            await self.sync_commands()
+
+    async def reconcile_guild(self, guild: Guild):
+        """Adds every member of the guild missing from the database
+
+        Known ids are fetched with one projected query and the missing members are
+        written with one bulk upsert per chunk of members, so the cost does not grow
+        with round-trips. Cached members form a single chunk; without a member cache
+        members are fetched and reconciled one page at a time.
+
+        Arguments
+        ---------
+        guild (discord.Guild): The guild to reconcile
+        """
+        added = 0
+        if self.lean:
+            chunk = []
+            async for member in guild.fetch_members(limit=None):
+                chunk.append(member)
+                if len(chunk) == config.LEAN_FETCH_CHUNK:
+                    added += await self.reconcile_members(chunk)
+                    chunk = []
+            added += await self.reconcile_members(chunk)
+        else:
+            added = await self.reconcile_members(guild.members)
+        if added:
+            logger.info(f"Added {added} members of {guild.name} to the database")
+
+    async def reconcile_members(self, members: List[Member]) -> int:
+        """Adds the given members missing from the database
+
+        Arguments
+        ---------
+        members (List[discord.Member]): The members to reconcile
+
+        Returns
+        -------
+        int: The number of members added
+        """
+        if not members:
+            return 0
+        by_id = {member.id: member for member in members}
+        known = await config.DATABASE.find_document_ids(
+            "ComboData", {"_id": {"$in": list(by_id)}}
+        )
+        missing = [member for _id, member in by_id.items() if _id not in known]
+        return await config.DATABASE.bulk_insert_documents_if_not_exist(
+            "ComboData", [member_document(member) for member in missing]
+        )
+
+    def profile(self, name: str):
+        """Profiles a phase when the watchdog is enabled with profiling
+
+        Arguments
+        ---------
+        name (str): The name of the profiled phase
+
+        Returns
+        -------
+        ContextManager: The profiling context, or a no-op one
+        """
+        if self.watchdog is None or not config.WATCHDOG_PROFILE:
+            return nullcontext()
+        return self.watchdog.profile(name)
 
     async def setup_hook(self) -> None:
         """Setup hook event for the bot"""
-        await self.load_cogs()
-        await self.tree.sync()
+        if self.watchdog is not None:
+            self.watchdog.start()
+        with self.profile("setup_hook"):
+            await self.start_metrics()
+            with phase("indexes"):
+                for collection_name, indexes in INDEXES.items():
+                    await config.DATABASE.ensure_indexes(collection_name, indexes)
+            with phase("cogs"):
+                await self.load_cogs()
+            with phase("command sync"):
+                await self.sync_commands()
+            if config.COG_HOT_RELOAD:
+                self.cog_watcher = asyncio.create_task(self.watch_cogs())
+            self.punishments.start()
+            self.view_expiry.start()
+            if config.DATABASE.sync.mirror is not None:
+                config.DATABASE.sync.mirror.start()
         logger.info("Setup hook completed")
 
-    @watch(path="src/bot/cogs")
-    async def on_ready(self):
-        """Bot ready event"""
-        await self.update_db()
-        logger.info("Database updated")
-
-        for guild in self.guilds:
-            guild.member_count
-            for member in guild.members:
-                data = config.DATABASE.find_one_document(
-                    "ComboData", {"_id": member.id}
-                )
-                if data["mute_time"] > 0:
-                    mute_time = data["mute_time"]
-                    await member.timeout(
-                        until=mute_time, reason="Muted after bot restart"
-                    )
-                if data["ban_time"] > 0:
-                    ban_time = data["ban_time"]
-                    await member.ban(reason="Banned after bot restart")
-                    asyncio.sleep(ban_time)
-                    await member.unban(reason="Unbanned after bot restart")
+    async def start_metrics(self):
+        """Exposes the metrics over HTTP and in the log, as configured"""
+        METRICS.register_gauge("actions", self.actions.stats)
+        METRICS.register_gauge("membership", self.membership.stats)
+        METRICS.register_gauge("guild", self.stats.stats)
+        if config.DATABASE.cache is not None:
+            METRICS.register_gauge("document_cache", config.DATABASE.cache.stats)
+        if config.DATABASE.sync.mirror is not None:
+            METRICS.register_gauge("mirror", config.DATABASE.sync.mirror.stats)
+        if self.metrics_port:
+            self.metrics_runner = await METRICS.serve(
+                config.METRICS_HOST, self.metrics_port
+            )
+        if config.METRICS_LOG_INTERVAL:
+            self.loop.create_task(METRICS.log_periodically(config.METRICS_LOG_INTERVAL))
+
+    def dispatch(self, event_name: str, /, *args: Any, **kwargs: Any) -> None:
+        """Dispatches an event, unless the bot is shutting down"""
+        if not self.closing:
+            super().dispatch(event_name, *args, **kwargs)
 
+    async def close(self) -> None:
+        """Shuts the bot down without losing queued work
+
+        Events stop being dispatched first. Timers are stopped, with pending view
+        expiries run early so no button outlives the process, queued membership
+        events and Discord actions are drained while the HTTP session is still
+        open, then the gateway is closed and the queued database updates are
+        written before the connection pool is closed.
+        """
+        if self.closing:
+            return
+        self.closing = True
+        with phase("shutdown"):
+            if self.cog_watcher is not None:
+                self.cog_watcher.cancel()
+            with phase("timers"):
+                await self.view_expiry.stop()
+                await self.view_expiry.expire()
+                await self.punishments.stop()
+                self.stats.stop()
+            with phase("actions drain"):
+                try:
+                    await self.membership.flush()
+                except Exception:
+                    logger.exception("Failed to flush membership events")
+                await self.actions.drain()
+            with phase("gateway close"):
+                await super().close()
+            with phase("database drain"):
+                if config.DATABASE.sync.mirror is not None:
+                    config.DATABASE.sync.mirror.stop()
+                try:
+                    await config.DATABASE.flush()
+                    logger.info("Queued database updates flushed")
+                finally:
+                    config.DATABASE.close()
+            if self.metrics_runner is not None:
+                await self.metrics_runner.cleanup()
+            if self.watchdog is not None:
+                self.watchdog.stop()
+
+    @METRICS.timed("event_handler")
+    async def on_shard_ready(self, shard_id: int):
+        """Shard ready event, reconciling only the guilds of the shard"""
+        guilds = [guild for guild in self.guilds if guild.shard_id == shard_id]
+        self.reconciled[shard_id].clear()
+        try:
+            await asyncio.gather(*(self.reconcile_guild(guild) for guild in guilds))
+        finally:
+            self.reconciled[shard_id].set()
+        logger.info(f"Shard {shard_id} ready, {len(guilds)} guilds reconciled")
+
+    @METRICS.timed("event_handler")
+    async def on_ready(self):
+        """Bot ready event, once every shard of this process is ready"""
         guild = utils.get(self.guilds, id=config.Ids.GUILD_ID.value)
-        activity = Activity(
-            name=f"{str(guild.member_count)} Members", type=ActivityType.watching
-        )
-        await self.change_presence(activity=activity)
-        logger.info("Presence updated")
+        logger.info(f"Startup took {time.perf_counter() - self.started_at:.2f}s")
+        if guild is None:
+            logger.info("Bot ready")
+            return
+
+        with self.profile("on_ready"):
+            await self.punishments.load()
+            # The stats are counted from ComboData, so the shard's reconciliation
+            # has to finish inserting the missing members first.
+            await self.reconciled[guild.shard_id].wait()
+            await self.stats.seed(guild)
 
         logger.info("Bot ready")
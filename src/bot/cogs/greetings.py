@@ -4,32 +4,34 @@ Copyright (c) 2023 Combo Gang. All rights reserved.
 This work is licensed under the terms of the MIT license.  
 For a copy, see <https://opensource.org/licenses/MIT>.
 """
-import asyncio
+import functools
+import time
 from discord.ext.commands import Cog
-from discord.ui import View, button, Button
-from discord import Embed, Interaction, Member, ButtonStyle, utils
+from discord.ui import View, Button
+from discord import Embed, Interaction, InteractionType, Member, NotFound, ButtonStyle, RawMemberRemoveEvent, utils
 
-from src.bot.bot import ComboBot
+from src.bot.bot import ComboBot, member_document
 from src.base import config
+from src.base.metrics import METRICS
+from src.base.models import Queries
+
+NUDGE_TIMEOUT = 30
+NUDGE_PREFIX = "nudge:"
 
 class NudgeButton(View):
     """Nudge button for the small welcome message
+
+    The target member id is encoded in the custom_id and clicks are handled by
+    Greetings.on_interaction, so the view is only a template and is never stored.
     
     Arguments
     ---------
-    member (discord.Member): The member that joins
+    member_id (int): The id of the member that joins
     """
-    def __init__(self, member: Member):
+    def __init__(self, member_id: int):
         super().__init__(timeout=None)
-        self.member = member
-    
-    @button(label="Nudge", custom_id="nudge_button", style=ButtonStyle.green, emoji="👆")
-    async def nudge_button(self, interaction: Interaction, button: Button):
-        config.DATABASE.update_document("ComboData", {"_id": interaction.user.id}, {"nudged": True})
-        channel = utils.get(interaction.guild.channels, id=config.Ids.CHAT_CHANNEL_ID.value)
-        await channel.send(f"{self.member.mention} was nudged by {interaction.user.mention}")
-        await interaction.response.defer()
-        return
+        self.add_item(Button(label="Nudge", custom_id=f"{NUDGE_PREFIX}{member_id}", style=ButtonStyle.green, emoji="👆"))
+        self.stop()
 
 def get_small_wmsg(member: Member) -> Embed:
     """Gets the small embed message for the #universal-chat channel
@@ -69,29 +71,55 @@ class Greetings(Cog):
         self.bot = bot
     
     @Cog.listener()
+    @METRICS.timed("event_handler")
     async def on_member_join(self, member: Member):
         """Calls when a member joins the server"""
-        await self.bot.update_db()
+        await config.DATABASE.bulk_insert_documents_if_not_exist("ComboData", [member_document(member)])
+        # A join lets members nudge again, which only needs a write if anyone has nudged.
+        nudged = await config.DATABASE.find_document_ids("ComboData", Queries.NUDGED.value)
+        if nudged:
+            await config.DATABASE.update_documents("ComboData", {"_id": {"$in": list(nudged)}}, {"nudged": False})
+        self.bot.membership.join(member)
+        self.bot.stats.joined(member)
         guild = utils.get(self.bot.guilds, id=config.Ids.GUILD_ID.value)
-        for _member in guild.members:
-            query = config.DATABASE.find_one_document("ComboData", {"_id": _member.id})
-            if query["nudged"]:
-                query["nudged"] = False
-        role = guild.get_role(config.Ids.UNVERIFIED_ROLE_ID.value)
-        await member.add_roles(role, reason="Just Joined")
         welcome_channel = guild.get_channel(config.Ids.WELCOME_CHANNEL_ID.value)
         chat_channel = guild.get_channel(config.Ids.CHAT_CHANNEL_ID.value)
         await welcome_channel.send(embed=get_big_wmsg(member))
-        msg = await chat_channel.send(embed=get_small_wmsg(member), view=NudgeButton(member))
-        await asyncio.sleep(30)
-        await msg.edit(view=None)
+        msg = await chat_channel.send(embed=get_small_wmsg(member), view=NudgeButton(member.id))
+        self.bot.view_expiry.schedule(("nudge", msg.id), time.time() + NUDGE_TIMEOUT, functools.partial(self.submit_expiry, chat_channel.id, msg.id))
+
+    async def submit_expiry(self, channel_id: int, message_id: int):
+        """Hands the removal of an expired nudge button to the action executor, keeping the timer task free"""
+        self.bot.actions.submit_nowait("edit_message", functools.partial(self.expire_nudge, channel_id, message_id))
+
+    async def expire_nudge(self, channel_id: int, message_id: int):
+        """Removes the nudge button once it expires"""
+        try:
+            await self.bot.get_partial_messageable(channel_id).get_partial_message(message_id).edit(view=None)
+        except NotFound:
+            pass
+
+    @Cog.listener()
+    async def on_interaction(self, interaction: Interaction):
+        """Dispatches clicks on nudge buttons, including ones sent before a restart"""
+        custom_id = (interaction.data or {}).get("custom_id", "")
+        if interaction.type is InteractionType.component and custom_id.startswith(NUDGE_PREFIX):
+            await self.nudge(interaction, int(custom_id[len(NUDGE_PREFIX):]))
+
+    @METRICS.timed("interaction_callback")
+    async def nudge(self, interaction: Interaction, member_id: int):
+        """Nudges the member the button was sent for"""
+        await config.DATABASE.queue_update("ComboData", interaction.user.id, {"nudged": True})
+        channel = utils.get(interaction.guild.channels, id=config.Ids.CHAT_CHANNEL_ID.value)
+        await channel.send(f"<@{member_id}> was nudged by {interaction.user.mention}")
+        await interaction.response.defer()
             
     @Cog.listener()
-    async def on_member_remove(self, member: Member):
-        """Calls when a member leaves the server"""
-        query = config.DATABASE.find_one_document("ComboData", {"_id": member.id})
-        if query["ban_time"] is None or query["mute_time"] is None:
-            config.DATABASE.delete_document("ComboData", {"_id": member.id})
+    @METRICS.timed("event_handler")
+    async def on_raw_member_remove(self, payload: RawMemberRemoveEvent):
+        """Calls when a member leaves the server, cached or not"""
+        self.bot.membership.leave(payload.user.id)
+        await self.bot.stats.left(payload.guild_id, payload.user)
         
 async def setup(bot: ComboBot):
     await bot.add_cog(Greetings(bot))
\ No newline at end of file
@@ -9,39 +9,60 @@ from discord.ui import View, button, Button
 from discord import Embed, app_commands, Interaction, ButtonStyle
 from datetime import datetime
 
-from src.bot.bot import ComboBot
-from src.bot import check
+from src.bot.bot import ComboBot, member_document
 from src.base import config
+from src.base.metrics import METRICS
+from src.base.models import Projections, Queries
 
 
 class VerifyButton(View):
-    """Verify button"""
+    """Verify button
 
-    def __init__(self):
+    The view is stateless: one instance is registered with the bot at startup and
+    handles clicks on every verify message, including ones sent before a restart.
+    A click is one conditional update, so double clicks verify a member only once,
+    and it creates the document of a member that has none yet. Members the mirror
+    or the document cache already know as verified are answered without a write.
+
+    Arguments
+    ---------
+    bot (ComboBot): The bot whose membership pipeline adds the role
+    """
+
+    def __init__(self, bot: ComboBot):
         super().__init__(timeout=None)
+        self.bot = bot
 
     @button(
         label="Verify", custom_id="verify_button", style=ButtonStyle.green, emoji="✅"
     )
+    @METRICS.timed("interaction_callback")
     async def verify_button(self, interaction: Interaction, button: Button):
-        if not check.is_verified(interaction.user.id):
-            config.DATABASE.find_document_and_update(
-                "ComboData",
-                {"_id": interaction.user.id},
-                {"verified": True, "verified_at": datetime.now()},
-            )
-            role = interaction.guild.get_role(config.Ids.VERIFIED_ROLE_ID.value)
-            await interaction.user.add_roles(role, reason="Verified")
-            embed = Embed(
-                title="Verified",
-                description=f"You have been successfully been verified in Combo's Services",
-            )
-            embed.set_thumbnail(url=interaction.guild.icon.url)
-            await interaction.response.send_message(embed=embed, ephemeral=True)
-        else:
-            await interaction.user.send("You are already verified")
-            await interaction.response.defer()
+        await interaction.response.defer()
+        known = await config.DATABASE.peek_document(
+            "ComboData", interaction.user.id, Projections.VERIFICATION.value
+        )
+        if known is not None and known.get("verified", False):
+            await interaction.followup.send("You are already verified", ephemeral=True)
             return
+        verified = await config.DATABASE.update_document_if_matches(
+            "ComboData",
+            interaction.user.id,
+            Queries.UNVERIFIED.value,
+            {"verified": True, "verified_at": datetime.now()},
+            member_document(interaction.user),
+        )
+        if not verified:
+            await interaction.followup.send("You are already verified", ephemeral=True)
+            return
+        self.bot.membership.verify(interaction.user)
+        self.bot.stats.verified(interaction.guild.id)
+        embed = Embed(
+            title="Verified",
+            description=f"You have been successfully been verified in Combo's Services",
+        )
+        embed.set_thumbnail(url=interaction.guild.icon.url)
+        await interaction.followup.send(embed=embed, ephemeral=True)
 
 
 class Verification(Cog):
@@ -53,6 +74,7 @@ class Verification(Cog):
     @app_commands.command(
         name="sendverify", description="Sends the verify embed to the channel"
     )
+    @METRICS.timed("interaction_callback")
     async def sendverify(self, ctx: Interaction):
         """Sends the verify embed to the channel"""
         embed = Embed(
@@ -61,9 +83,12 @@ class Verification(Cog):
             color=0x00FF00,
         )
         embed.set_thumbnail(url=ctx.guild.icon.url)
-        await ctx.response.send_message(embed=embed, view=VerifyButton())
+        template = VerifyButton(self.bot)
+        template.stop()
+        await ctx.response.send_message(embed=embed, view=template)
 
 
 async def setup(bot: ComboBot):
     """Setup function for the cog"""
+    bot.add_view(VerifyButton(bot))
     await bot.add_cog(Verification(bot))
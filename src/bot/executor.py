@@ -0,0 +1,160 @@
+"""
+Copyright (c) 2023 Combo Gang. All rights reserved.
+
+This work is licensed under the terms of the MIT license.  
+For a copy, see <https://opensource.org/licenses/MIT>.
+"""
+import asyncio
+import time
+from collections import defaultdict
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Set
+from discord import HTTPException, RateLimited
+from loguru import logger
+
+from src.base.metrics import METRICS
+
+
+class ActionExecutor:
+    """Runs Discord actions with bounded concurrency, per-route limits and retries
+
+    discord.py already waits out known rate limit buckets, so the per-route
+    semaphores only keep a burst on one route (e.g. bans) from queueing hundreds
+    of requests on the same bucket and starving every other route. Rate limited
+    and 5xx responses are retried with exponential backoff.
+
+    Arguments
+    ---------
+    concurrency (int): Maximum number of actions in flight
+    per_route (int): Maximum number of actions in flight per route
+    retries (int): Number of retries after a rate limited or server error
+    backoff (float): Seconds to wait before the first retry, doubled each time
+    """
+
+    def __init__(
+        self,
+        concurrency: int = 10,
+        per_route: int = 3,
+        retries: int = 3,
+        backoff: float = 1.0,
+    ):
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.routes: Dict[str, asyncio.Semaphore] = defaultdict(
+            lambda: asyncio.Semaphore(per_route)
+        )
+        self.retries = retries
+        self.backoff = backoff
+        self.tasks: Set[asyncio.Task] = set()
+        self.counters: Dict[str, int] = defaultdict(int)
+
+    async def submit(self, route: str, action: Callable[[], Awaitable[Any]]) -> Any:
+        """Runs an action and waits for its result
+
+        Arguments
+        ---------
+        route (str): The route the action calls, e.g. "ban" or "timeout"
+        action (Callable[[], Awaitable[Any]]): The coroutine function to run
+
+        Returns
+        -------
+        Any: The result of the action
+        """
+        self.counters["submitted"] += 1
+        async with self.routes[route], self.semaphore:
+            self.counters["in_flight"] += 1
+            try:
+                with METRICS.track("discord_action", route=route):
+                    return await self._attempt(route, action)
+            finally:
+                self.counters["in_flight"] -= 1
+
+    def submit_nowait(
+        self, route: str, action: Callable[[], Awaitable[Any]]
+    ) -> asyncio.Task:
+        """Runs an action in the background
+
+        Arguments
+        ---------
+        route (str): The route the action calls
+        action (Callable[[], Awaitable[Any]]): The coroutine function to run
+
+        Returns
+        -------
+        asyncio.Task: The task running the action
+        """
+        task = asyncio.create_task(self.submit(route, action))
+        self.tasks.add(task)
+        task.add_done_callback(self._done)
+        return task
+
+    async def map(
+        self, route: str, actions: Iterable[Callable[[], Awaitable[Any]]]
+    ) -> List[Any]:
+        """Runs many actions concurrently and waits for all of them
+
+        Arguments
+        ---------
+        route (str): The route the actions call
+        actions (Iterable[Callable[[], Awaitable[Any]]]): The coroutine functions to run
+
+        Returns
+        -------
+        List[Any]: The results, with exceptions in place of failed actions
+        """
+        start = time.perf_counter()
+        results = await asyncio.gather(
+            *(self.submit(route, action) for action in actions),
+            return_exceptions=True,
+        )
+        failed = sum(isinstance(result, Exception) for result in results)
+        logger.info(
+            f"Ran {len(results)} {route} actions ({failed} failed) "
+            f"in {time.perf_counter() - start:.2f}s"
+        )
+        return results
+
+    async def drain(self):
+        """Waits for every background action to finish"""
+        if self.tasks:
+            await asyncio.gather(*self.tasks, return_exceptions=True)
+
+    def stats(self) -> Dict[str, int]:
+        """Gets the executor counters
+
+        Returns
+        -------
+        Dict[str, int]: The submitted, completed, failed, retried and in flight counts
+        """
+        return dict(self.counters)
+
+    async def _attempt(self, route: str, action: Callable[[], Awaitable[Any]]) -> Any:
+        delay = self.backoff
+        for attempt in range(self.retries + 1):
+            try:
+                result = await action()
+            except RateLimited as error:
+                if attempt == self.retries:
+                    self.counters["failed"] += 1
+                    raise
+                wait = max(error.retry_after, delay)
+            except HTTPException as error:
+                if attempt == self.retries or not (
+                    error.status == 429 or error.status >= 500
+                ):
+                    self.counters["failed"] += 1
+                    raise
+                wait = delay
+            except Exception:
+                self.counters["failed"] += 1
+                raise
+            else:
+                self.counters["completed"] += 1
+                return result
+            self.counters["retried"] += 1
+            logger.warning(f"Retrying {route} action in {wait:.1f}s")
+            await asyncio.sleep(wait)
+            delay *= 2
+
+    def _done(self, task: asyncio.Task):
+        self.tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.opt(exception=task.exception()).error("Background action failed")
@@ -0,0 +1,152 @@
+"""
+Copyright (c) 2023 Combo Gang. All rights reserved.
+
+This work is licensed under the terms of the MIT license.  
+For a copy, see <https://opensource.org/licenses/MIT>.
+"""
+import asyncio
+import functools
+from discord import Member, Object
+from loguru import logger
+from typing import Dict, Optional, Set, Tuple
+
+from src.base import config
+from src.base.models import Queries
+from src.bot.executor import ActionExecutor
+
+# A leaver keeps their document while it holds anything that must still apply if
+# they come back: an active ban or mute, the blacklist, warns or past punishments.
+RETAINED = [
+    *Queries.ACTIVE_PUNISHMENTS.value["$or"],
+    {"blacklisted": True},
+    {"warns": {"$nin": [None, {}]}},
+    {"punishments": {"$nin": [None, {}]}},
+]
+
+
+class MembershipPipeline:
+    """Queues membership events and applies them in batches
+
+    Events are coalesced per member: a leave drops the role edits queued for the
+    member and a join or verification cancels a queued leave. Leaves are written
+    as one delete of every member without a moderation record (RETAINED), without
+    reading their documents first, and role edits run through the action executor,
+    so handlers only record the event and return.
+
+    Arguments
+    ---------
+    actions (ActionExecutor): The executor running the role edits
+    batch_size (int): Number of queued members that triggers a flush
+    flush_interval (float): Seconds a queued event waits at most
+    """
+
+    def __init__(
+        self,
+        actions: ActionExecutor,
+        batch_size: int = 500,
+        flush_interval: float = 1.0,
+    ):
+        self.actions = actions
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.roles: Dict[int, Tuple[Member, Dict[int, str]]] = {}
+        self.leaves: Set[int] = set()
+        self.flush_task: Optional[asyncio.Task] = None
+        self.flush_lock = asyncio.Lock()
+        self.full = asyncio.Event()
+
+    def join(self, member: Member):
+        """Queues the roles of a member that just joined
+
+        Arguments
+        ---------
+        member (discord.Member): The member that joined
+        """
+        self._add_role(member, config.Ids.UNVERIFIED_ROLE_ID.value, "Just Joined")
+
+    def verify(self, member: Member):
+        """Queues the roles of a member that just verified
+
+        Arguments
+        ---------
+        member (discord.Member): The member that verified
+        """
+        self._add_role(member, config.Ids.VERIFIED_ROLE_ID.value, "Verified")
+
+    def leave(self, member_id: int):
+        """Queues the removal of a member that left
+
+        Arguments
+        ---------
+        member_id (int): The id of the member that left
+        """
+        self.roles.pop(member_id, None)
+        self.leaves.add(member_id)
+        self._schedule()
+
+    def stats(self) -> Dict[str, int]:
+        """Gets the number of queued members
+
+        Returns
+        -------
+        Dict[str, int]: The queued role edits and leaves
+        """
+        return {"roles": len(self.roles), "leaves": len(self.leaves)}
+
+    async def flush(self):
+        """Writes the queued leaves and applies the queued role edits"""
+        async with self.flush_lock:
+            leaves, self.leaves = self.leaves, set()
+            roles, self.roles = self.roles, {}
+            try:
+                if leaves:
+                    await self._remove(leaves)
+            finally:
+                if roles:
+                    await self.actions.map(
+                        "add_roles",
+                        [
+                            functools.partial(
+                                member.add_roles,
+                                *(Object(id=role_id) for role_id in edits),
+                                reason=", ".join(edits.values()),
+                            )
+                            for member, edits in roles.values()
+                        ],
+                    )
+
+    async def _remove(self, leaves: Set[int]):
+        try:
+            deleted = await config.DATABASE.delete_documents(
+                "ComboData", {"_id": {"$in": list(leaves)}, "$nor": RETAINED}
+            )
+        except Exception:
+            self.leaves |= {_id for _id in leaves if _id not in self.roles}
+            raise
+        logger.info(f"Removed {deleted} of {len(leaves)} members that left")
+
+    def _add_role(self, member: Member, role_id: int, reason: str):
+        self.leaves.discard(member.id)
+        _, edits = self.roles.setdefault(member.id, (member, {}))
+        edits[role_id] = reason
+        self._schedule()
+
+    def _schedule(self):
+        if len(self.roles) + len(self.leaves) >= self.batch_size:
+            self.full.set()
+        if self.flush_task is None or self.flush_task.done():
+            self.flush_task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        try:
+            await asyncio.wait_for(self.full.wait(), self.flush_interval)
+        except asyncio.TimeoutError:
+            pass
+        self.full.clear()
+        self.flush_task = None
+        try:
+            await self.flush()
+        except Exception:
+            logger.exception("Failed to flush membership events")
+            if self.flush_task is None and (self.roles or self.leaves):
+                self.flush_task = asyncio.create_task(self._flush_later())
@@ -0,0 +1,265 @@
+"""
+Copyright (c) 2023 Combo Gang. All rights reserved.
+
+This work is licensed under the terms of the MIT license.  
+For a copy, see <https://opensource.org/licenses/MIT>.
+"""
+import asyncio
+import functools
+import heapq
+import itertools
+import time
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+from discord import Member, NotFound, Object
+from loguru import logger
+
+from src.base import config
+from src.base.models import MemberRecord, Projections, Queries
+
+
+class TimerHeap:
+    """Runs callbacks at absolute times from a single task
+
+    Callbacks are keyed, so scheduling a key again replaces the previous deadline
+    and cancelled entries are skipped lazily when they reach the top of the heap.
+    """
+
+    def __init__(self):
+        self.heap: List[Tuple[float, int, Hashable]] = []
+        self.callbacks: Dict[Hashable, Tuple[float, Callable[[], Awaitable[None]]]] = {}
+        self.counter = itertools.count()
+        self.wakeup = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self.callbacks)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.callbacks
+
+    def schedule(
+        self, key: Hashable, when: float, callback: Callable[[], Awaitable[None]]
+    ):
+        """Schedules a callback
+
+        Arguments
+        ---------
+        key (Hashable): The key of the timer, replacing any timer with the same key
+        when (float): The UNIX timestamp to run the callback at
+        callback (Callable[[], Awaitable[None]]): The coroutine function to run
+        """
+        self.callbacks[key] = (when, callback)
+        heapq.heappush(self.heap, (when, next(self.counter), key))
+        if self.heap[0][2] == key:
+            self.wakeup.set()
+
+    def cancel(self, key: Hashable):
+        """Cancels a scheduled callback
+
+        Arguments
+        ---------
+        key (Hashable): The key of the timer
+        """
+        self.callbacks.pop(key, None)
+
+    def start(self):
+        """Starts the timer task"""
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stops the timer task, leaving pending timers unfired"""
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    async def expire(self):
+        """Runs every pending callback now, in deadline order, and clears the timers"""
+        pending = sorted(self.callbacks.items(), key=lambda item: item[1][0])
+        self.callbacks.clear()
+        self.heap.clear()
+        for key, (_, callback) in pending:
+            try:
+                await callback()
+            except Exception:
+                logger.exception(f"Timer {key} failed")
+
+    async def _run(self):
+        while True:
+            while self.heap and self.heap[0][0] <= time.time():
+                when, _, key = heapq.heappop(self.heap)
+                entry = self.callbacks.get(key)
+                if entry is None or entry[0] != when:
+                    continue
+                del self.callbacks[key]
+                try:
+                    await entry[1]()
+                except Exception:
+                    logger.exception(f"Timer {key} failed")
+            self.wakeup.clear()
+            timeout = self.heap[0][0] - time.time() if self.heap else None
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+
+class PunishmentScheduler:
+    """Persists timed bans and mutes and lifts them at expiry
+
+    Expiries are stored in ComboData as absolute UNIX timestamps in ban_time and
+    mute_time, 0 meaning no punishment, so they survive restarts and can be
+    reloaded with a single query.
+
+    Arguments
+    ---------
+    bot (discord.ext.commands.Bot): The bot the punishments are applied with
+    """
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.timers = TimerHeap()
+
+    def start(self):
+        """Starts the timer task"""
+        self.timers.start()
+
+    async def stop(self):
+        """Stops the timer task"""
+        await self.timers.stop()
+
+    async def load(self) -> int:
+        """Schedules every active punishment stored in the database
+
+        Returns
+        -------
+        int: The number of punishments scheduled
+        """
+        now = time.time()
+        restores = []
+        documents = await config.DATABASE.find_documents(
+            "ComboData",
+            Queries.ACTIVE_PUNISHMENTS.value,
+            Projections.PUNISHMENTS.value,
+        )
+        scheduled = 0
+        for document in documents:
+            record = MemberRecord.from_document(document)
+            if record.ban_time > 0:
+                self._schedule_unban(record.id, record.ban_time)
+                scheduled += 1
+            if record.mute_time > 0:
+                if record.mute_time > now:
+                    restores.append(
+                        functools.partial(
+                            self._restore_mute, record.id, record.mute_time
+                        )
+                    )
+                self._schedule_unmute(record.id, record.mute_time)
+                scheduled += 1
+        logger.info(f"Scheduled {scheduled} punishments")
+        await self.bot.actions.map("timeout", restores)
+        return scheduled
+
+    async def ban(self, member: Member, until: float, reason: Optional[str] = None):
+        """Bans a member until the given time
+
+        Arguments
+        ---------
+        member (discord.Member): The member to ban
+        until (float): The UNIX timestamp the ban expires at
+        reason (Optional[str]): The audit log reason
+        """
+        await config.DATABASE.update_document(
+            "ComboData", {"_id": member.id}, {"ban_time": until}
+        )
+        await member.ban(reason=reason)
+        if ("ban", member.id) not in self.timers:
+            self.bot.stats.punished(member.guild.id, 1)
+        self._schedule_unban(member.id, until)
+
+    async def mute(self, member: Member, until: float, reason: Optional[str] = None):
+        """Times out a member until the given time
+
+        Arguments
+        ---------
+        member (discord.Member): The member to mute
+        until (float): The UNIX timestamp the mute expires at
+        reason (Optional[str]): The audit log reason
+        """
+        await config.DATABASE.update_document(
+            "ComboData", {"_id": member.id}, {"mute_time": until}
+        )
+        await member.timeout(_as_datetime(until), reason=reason)
+        if ("mute", member.id) not in self.timers:
+            self.bot.stats.punished(member.guild.id, 1)
+        self._schedule_unmute(member.id, until)
+
+    def _schedule_unban(self, user_id: int, until: float):
+        async def unban():
+            guild = self.bot.get_guild(config.Ids.GUILD_ID.value)
+            try:
+                await guild.unban(Object(id=user_id), reason="Ban expired")
+            except NotFound:
+                pass
+            await config.DATABASE.update_document(
+                "ComboData", {"_id": user_id}, {"ban_time": 0}
+            )
+            self.bot.stats.punished(guild.id, -1)
+            logger.info(f"Unbanned {user_id}")
+
+        self.timers.schedule(
+            ("ban", user_id), until, lambda: self._submit("unban", unban)
+        )
+
+    def _schedule_unmute(self, user_id: int, until: float):
+        async def unmute():
+            member = await self._get_member(user_id)
+            if member is not None and member.is_timed_out():
+                await member.timeout(None, reason="Mute expired")
+            await config.DATABASE.update_document(
+                "ComboData", {"_id": user_id}, {"mute_time": 0}
+            )
+            self.bot.stats.punished(config.Ids.GUILD_ID.value, -1)
+            logger.info(f"Unmuted {user_id}")
+
+        self.timers.schedule(
+            ("mute", user_id), until, lambda: self._submit("timeout", unmute)
+        )
+
+    async def _submit(self, route: str, action: Callable[[], Awaitable[None]]):
+        self.bot.actions.submit_nowait(route, action)
+
+    async def _get_member(self, user_id: int) -> Optional[Member]:
+        guild = self.bot.get_guild(config.Ids.GUILD_ID.value)
+        member = guild.get_member(user_id)
+        if member is None:
+            try:
+                member = await guild.fetch_member(user_id)
+            except NotFound:
+                return None
+        return member
+
+    async def _restore_mute(self, user_id: int, until: float):
+        member = await self._get_member(user_id)
+        if member is not None and not member.is_timed_out():
+            await member.timeout(_as_datetime(until), reason="Muted after bot restart")
+
+
+def _as_datetime(timestamp: float) -> datetime:
+    """Converts a stored expiry to an aware datetime
+
+    Arguments
+    ---------
+    timestamp (float): The UNIX timestamp
+
+    Returns
+    -------
+    datetime: The expiry as a UTC datetime
+    """
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc)
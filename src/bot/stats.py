@@ -0,0 +1,173 @@
+"""
+Copyright (c) 2023 Combo Gang. All rights reserved.
+
+This work is licensed under the terms of the MIT license.  
+For a copy, see <https://opensource.org/licenses/MIT>.
+"""
+import asyncio
+import time
+from collections import Counter, defaultdict
+from discord import Activity, ActivityType, Guild, Member, User
+from loguru import logger
+from typing import Dict, Optional, Union
+
+from src.base import config
+from src.base.models import Pipelines, Projections
+
+FIELDS = ("members", "verified", "unverified", "punished")
+
+
+class StatsService:
+    """Keeps live per-guild member counters and the presence showing them
+
+    Counters are seeded with one aggregation over ComboData and then follow the
+    join, leave, verification and punishment events, so reading them never scans
+    members or the collection. punished counts active bans and mutes. The
+    verification state of a member leaving uncached is looked up in the mirror or
+    the document cache; if neither holds it, only members changes until the next
+    seed. The presence is changed at most once per interval.
+
+    Arguments
+    ---------
+    bot (discord.Client): The bot whose presence shows the member count
+    interval (float): Minimum seconds between two presence changes
+    """
+
+    def __init__(self, bot, interval: float = 60):
+        self.bot = bot
+        self.interval = interval
+        self.counters: Dict[int, Counter] = defaultdict(Counter)
+        self.presence_task: Optional[asyncio.Task] = None
+        self.presence_changed_at = float("-inf")
+        self.presence_members: Optional[int] = None
+
+    async def seed(self, guild: Guild):
+        """Sets the counters of a guild from ComboData and its member count
+
+        Arguments
+        ---------
+        guild (discord.Guild): The guild to seed
+        """
+        results = await config.DATABASE.aggregate(
+            "ComboData", Pipelines.MEMBER_STATS.value
+        )
+        totals = results[0] if results else {}
+        documents = totals.get("documents", 0)
+        verified = totals.get("verified", 0)
+        self.counters[guild.id] = Counter(
+            members=guild.member_count or documents,
+            verified=verified,
+            unverified=documents - verified,
+            punished=totals.get("punished", 0),
+        )
+        logger.info(f"Seeded stats of {guild.name}: {self.get(guild.id)}")
+        self._changed(guild.id)
+
+    def get(self, guild_id: int) -> Dict[str, int]:
+        """Gets the counters of a guild
+
+        Arguments
+        ---------
+        guild_id (int): The id of the guild
+
+        Returns
+        -------
+        Dict[str, int]: The members, verified, unverified and punished counters
+        """
+        counters = self.counters.get(guild_id, Counter())
+        return {field: counters[field] for field in FIELDS}
+
+    def stats(self) -> Dict[str, int]:
+        """Gets the counters of the home guild for the metrics
+
+        Returns
+        -------
+        Dict[str, int]: The counters of the home guild
+        """
+        return self.get(config.Ids.GUILD_ID.value)
+
+    def joined(self, member: Member):
+        """Counts a member that joined
+
+        Arguments
+        ---------
+        member (discord.Member): The member that joined
+        """
+        self._add(member.guild.id, members=1, **{self._state(member.bot): 1})
+
+    async def left(self, guild_id: int, user: Union[Member, User]):
+        """Counts a member that left
+
+        Arguments
+        ---------
+        guild_id (int): The id of the guild the member left
+        user (Union[discord.Member, discord.User]): The member, or only the user if it was not cached
+        """
+        if isinstance(user, Member):
+            verified = user.bot or user.get_role(config.Ids.VERIFIED_ROLE_ID.value)
+            self._add(guild_id, members=-1, **{self._state(verified): -1})
+            return
+        known = await config.DATABASE.peek_document(
+            "ComboData", user.id, Projections.VERIFICATION.value
+        )
+        if known is None:
+            self._add(guild_id, members=-1)
+        else:
+            verified = known.get("verified", False)
+            self._add(guild_id, members=-1, **{self._state(verified): -1})
+
+    def verified(self, guild_id: int):
+        """Counts a member that verified
+
+        Arguments
+        ---------
+        guild_id (int): The id of the guild the member verified in
+        """
+        self._add(guild_id, verified=1, unverified=-1)
+
+    def punished(self, guild_id: int, change: int):
+        """Counts punishments that were given or lifted
+
+        Arguments
+        ---------
+        guild_id (int): The id of the guild of the punishments
+        change (int): The number of punishments given, negative when lifted
+        """
+        self._add(guild_id, punished=change)
+
+    def stop(self):
+        """Cancels a pending presence change"""
+        if self.presence_task is not None:
+            self.presence_task.cancel()
+
+    @staticmethod
+    def _state(verified) -> str:
+        return "verified" if verified else "unverified"
+
+    def _add(self, guild_id: int, **changes: int):
+        self.counters[guild_id].update(changes)
+        self._changed(guild_id)
+
+    def _changed(self, guild_id: int):
+        if guild_id != config.Ids.GUILD_ID.value:
+            return
+        if self.presence_task is None or self.presence_task.done():
+            self.presence_task = asyncio.create_task(self._update_presence())
+
+    async def _update_presence(self):
+        wait = self.presence_changed_at + self.interval - time.monotonic()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        # Changes from now on schedule another update.
+        self.presence_task = None
+        members = self.counters[config.Ids.GUILD_ID.value]["members"]
+        if members == self.presence_members:
+            return
+        self.presence_changed_at = time.monotonic()
+        self.presence_members = members
+        activity = Activity(name=f"{members} Members", type=ActivityType.watching)
+        try:
+            await self.bot.change_presence(activity=activity)
+        except Exception:
+            self.presence_members = None
+            logger.exception("Failed to update the presence")
@@ -0,0 +1,120 @@
+"""
+Copyright (c) 2023 Combo Gang. All rights reserved.
+
+This work is licensed under the terms of the MIT license.  
+For a copy, see <https://opensource.org/licenses/MIT>.
+"""
+import asyncio
+import cProfile
+import io
+import pstats
+import sys
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+from typing import Iterator, Optional
+from loguru import logger
+
+from src.base.metrics import METRICS
+
+report = logger.bind(watchdog=True)
+
+
+class LoopWatchdog:
+    """Detects event loop stalls and profiles slow startup phases
+
+    A heartbeat task on the loop records when it last ran. A watcher thread
+    notices when the heartbeat is late by more than the threshold and captures
+    the stack of the loop thread while it is still blocked. Reports go to their
+    own log file.
+
+    Arguments
+    ---------
+    threshold (float): Seconds the loop may be blocked before it is reported
+    interval (float): Seconds between two heartbeats
+    log_path (str): File the reports are written to
+    """
+
+    def __init__(
+        self, threshold: float = 0.25, interval: float = 0.05, log_path: str = "bot.log"
+    ):
+        self.threshold = threshold
+        self.interval = interval
+        self.log_path = log_path
+        self.beat = time.monotonic()
+        self.reported_beat: Optional[float] = None
+        self.loop_thread: Optional[int] = None
+        self.stopped = threading.Event()
+        self.heartbeat_task: Optional[asyncio.Task] = None
+        self.sink: Optional[int] = None
+        self.profiling = False
+
+    def start(self):
+        """Starts the heartbeat task and the watcher thread"""
+        self.sink = logger.add(
+            self.log_path, filter=lambda record: record["extra"].get("watchdog")
+        )
+        self.loop_thread = threading.get_ident()
+        self.beat = time.monotonic()
+        self.heartbeat_task = asyncio.create_task(self._heartbeat())
+        threading.Thread(target=self._watch, name="loop-watchdog", daemon=True).start()
+        logger.info(f"Loop watchdog started with a {self.threshold}s threshold")
+
+    def stop(self):
+        """Stops the heartbeat task and the watcher thread"""
+        self.stopped.set()
+        if self.heartbeat_task is not None:
+            self.heartbeat_task.cancel()
+        if self.sink is not None:
+            logger.remove(self.sink)
+            self.sink = None
+
+    @contextmanager
+    def profile(self, name: str) -> Iterator[None]:
+        """Profiles everything the loop thread runs within the block
+
+        Arguments
+        ---------
+        name (str): The name of the profiled phase
+        """
+        if self.profiling:
+            yield
+            return
+        self.profiling = True
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            self.profiling = False
+            elapsed = time.perf_counter() - start
+            output = io.StringIO()
+            stats = pstats.Stats(profiler, stream=output)
+            stats.sort_stats("cumulative").print_stats(25)
+            report.info(f"Profile of {name} ({elapsed:.2f}s)\n{output.getvalue()}")
+
+    async def _heartbeat(self):
+        while True:
+            beat = self.beat = time.monotonic()
+            await asyncio.sleep(self.interval)
+            lag = time.monotonic() - beat - self.interval
+            METRICS.observe("loop_lag", max(lag, 0))
+            # A stall the watcher thread caught was already reported with its stack.
+            if lag > self.threshold and self.reported_beat != beat:
+                report.warning(f"Event loop was blocked for {lag:.3f}s")
+
+    def _watch(self):
+        while not self.stopped.wait(self.interval):
+            beat = self.beat
+            if beat == self.reported_beat:
+                continue
+            if time.monotonic() - beat - self.interval > self.threshold:
+                self.reported_beat = beat
+                frame = sys._current_frames().get(self.loop_thread)
+                stack = "".join(traceback.format_stack(frame)) if frame else ""
+                report.warning(
+                    f"Event loop blocked for more than {self.threshold}s at\n{stack}"
+                )
@@ -0,0 +1,177 @@
+"""
+Copyright (c) 2023 Combo Gang. All rights reserved.
+
+This work is licensed under the terms of the MIT license.  
+For a copy, see <https://opensource.org/licenses/MIT>.
+"""
+import asyncio
+import time
+from contextlib import nullcontext
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+from discord import InteractionType
+
+from src.base import config
+from src.bot.executor import ActionExecutor
+from src.bot.membership import MembershipPipeline
+from src.bot.scheduler import PunishmentScheduler, TimerHeap
+from src.bot.stats import StatsService
+
+
+class FakeMessage:
+    """Message returned by FakeChannel.send"""
+
+    def __init__(self, channel: "FakeChannel", kwargs: Dict[str, Any]):
+        self.channel = channel
+        self.id = len(channel.sent)
+        self.kwargs = kwargs
+
+    async def edit(self, **kwargs):
+        self.kwargs.update(kwargs)
+
+
+class FakeChannel:
+    """Text channel recording sent messages"""
+
+    def __init__(self, id: int, latency: float = 0):
+        self.id = id
+        self.latency = latency
+        self.sent: List[FakeMessage] = []
+
+    async def send(self, content: Optional[str] = None, **kwargs) -> FakeMessage:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        message = FakeMessage(self, {"content": content, **kwargs})
+        self.sent.append(message)
+        return message
+
+
+class FakeMember:
+    """Guild member with the attributes the cogs use"""
+
+    def __init__(self, id: int, guild: "FakeGuild", bot: bool = False):
+        self.id = id
+        self.name = f"member{id}"
+        self.mention = f"<@{id}>"
+        self.bot = bot
+        self.joined_at = datetime(2024, 1, 1)
+        self.avatar = SimpleNamespace(url=f"https://cdn.example/{id}.png")
+        self.guild = guild
+        self.roles: List[Any] = []
+        self.timed_out_until = None
+        self.dm_channel = FakeChannel(id)
+
+    async def add_roles(self, *roles, reason: Optional[str] = None):
+        if self.guild.latency:
+            await asyncio.sleep(self.guild.latency)
+        self.roles.extend(roles)
+
+    async def send(self, content: Optional[str] = None, **kwargs):
+        return await self.dm_channel.send(content, **kwargs)
+
+    async def timeout(self, until, reason: Optional[str] = None):
+        self.timed_out_until = until
+
+    def is_timed_out(self) -> bool:
+        return self.timed_out_until is not None
+
+
+class FakeGuild:
+    """Guild with synthetic members, roles and channels
+
+    Arguments
+    ---------
+    size (int): Number of members to create
+    latency (float): Seconds every simulated Discord API call takes
+    """
+
+    def __init__(self, size: int, latency: float = 0):
+        self.id = config.Ids.GUILD_ID.value
+        self.name = "Combo's Services"
+        self.latency = latency
+        self.icon = SimpleNamespace(url="https://cdn.example/icon.png")
+        self.channels = [FakeChannel(id.value, latency) for id in config.Ids]
+        self.roles = {
+            id.value: SimpleNamespace(id=id.value)
+            for id in (config.Ids.VERIFIED_ROLE_ID, config.Ids.UNVERIFIED_ROLE_ID)
+        }
+        self.members = [FakeMember(id, self) for id in range(1, size + 1)]
+        self.member_count = size
+        self.unbanned: List[int] = []
+
+    def get_role(self, id: int):
+        return self.roles.get(id)
+
+    def get_channel(self, id: int) -> Optional[FakeChannel]:
+        return next((channel for channel in self.channels if channel.id == id), None)
+
+    async def unban(self, user, reason: Optional[str] = None):
+        self.unbanned.append(user.id)
+
+    def get_member(self, id: int) -> Optional[FakeMember]:
+        return self.members[id - 1] if 0 < id <= len(self.members) else None
+
+    def join(self) -> FakeMember:
+        member = FakeMember(len(self.members) + 1, self)
+        self.members.append(member)
+        self.member_count += 1
+        return member
+
+
+class FakeResponse:
+    """Interaction response recording what was sent"""
+
+    def __init__(self):
+        self.sent: List[Dict[str, Any]] = []
+        self.deferred = False
+
+    async def send_message(self, content: Optional[str] = None, **kwargs):
+        self.sent.append({"content": content, **kwargs})
+
+    async def defer(self, **kwargs):
+        self.deferred = True
+
+    def is_done(self) -> bool:
+        return self.deferred or bool(self.sent)
+
+
+class FakeInteraction:
+    """Button interaction of a member"""
+
+    def __init__(self, member: FakeMember, custom_id: Optional[str] = None):
+        self.type = InteractionType.component
+        self.user = member
+        self.guild = member.guild
+        self.response = FakeResponse()
+        self.followup = FakeChannel(0, member.guild.latency)
+        self.data = {"custom_id": custom_id, "component_type": 2}
+
+
+class FakeBot:
+    """Bot with the services the cogs use, recording its presence
+
+    Arguments
+    ---------
+    guild (FakeGuild): The home guild
+    """
+
+    def __init__(self, guild: FakeGuild):
+        self.guilds = [guild]
+        self.actions = ActionExecutor()
+        self.membership = MembershipPipeline(self.actions)
+        self.stats = StatsService(self)
+        self.view_expiry = TimerHeap()
+        self.punishments = PunishmentScheduler(self)
+        self.started_at = time.perf_counter()
+        self.activity = None
+
+    def get_guild(self, id: int) -> Optional[FakeGuild]:
+        return next((guild for guild in self.guilds if guild.id == id), None)
+
+    def profile(self, name: str):
+        return nullcontext()
+
+    async def change_presence(self, activity=None, **kwargs):
+        self.activity = activity
@@ -0,0 +1,278 @@
+"""
+Copyright (c) 2023 Combo Gang. All rights reserved.
+
+This work is licensed under the terms of the MIT license.  
+For a copy, see <https://opensource.org/licenses/MIT>.
+"""
+import asyncio
+import os
+import tracemalloc
+from types import SimpleNamespace
+
+import pytest
+
+mongomock = pytest.importorskip("mongomock")
+pytest.importorskip("pytest_benchmark")
+
+from fakes import FakeBot, FakeGuild, FakeInteraction
+from simulation import CountingDatabase
+from src.base import config
+from src.base.cache import DocumentCache
+from src.base.database import AsyncMongoDBUtility
+from src.base.models import MemberRecord
+from src.bot.bot import ComboBot
+from src.bot.cogs import greetings, verification
+
+LARGE = pytest.mark.skipif(
+    not os.environ.get("BENCHMARK_LARGE"), reason="BENCHMARK_LARGE is not set"
+)
+SIZES = [
+    1_000,
+    pytest.param(10_000, marks=LARGE),
+    pytest.param(100_000, marks=LARGE),
+]
+
+
+@pytest.fixture
+def database(monkeypatch):
+    database = AsyncMongoDBUtility(
+        mongomock.MongoClient(), "CombosBotBench", cache=DocumentCache()
+    )
+    database.sync.database = CountingDatabase(database.sync.database)
+    monkeypatch.setitem(vars(config), "DATABASE", database)
+    yield database
+    database.close()
+
+
+def populate(database: AsyncMongoDBUtility, guild: FakeGuild):
+    """Writes every member of the guild straight to the stand-in database"""
+    database.sync.database.database["ComboData"].insert_many(
+        [
+            MemberRecord(member.id, username=member.name).to_document()
+            for member in guild.members
+        ]
+    )
+
+
+def measure(benchmark, database: AsyncMongoDBUtility, flow, setup=None) -> int:
+    """Benchmarks one run of a flow and records its round-trips and peak allocations
+
+    Arguments
+    ---------
+    benchmark (pytest_benchmark.fixture.BenchmarkFixture): The benchmark fixture
+    database (AsyncMongoDBUtility): The stand-in database
+    flow (Callable[[], Awaitable[None]]): The flow to run
+    setup (Optional[Callable[[], None]]): Called before each run, outside of the timing
+
+    Returns
+    -------
+    int: The number of database round-trips of the timed run
+    """
+
+    def prepare():
+        if setup is not None:
+            setup()
+        database.sync.database.counter.clear()
+        return (), {}
+
+    benchmark.pedantic(lambda: asyncio.run(flow()), setup=prepare, rounds=1)
+    round_trips = database.sync.database.round_trips
+    prepare()
+    tracemalloc.start()
+    asyncio.run(flow())
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    benchmark.extra_info.update(
+        {
+            "round_trips": round_trips,
+            "operations": dict(database.sync.database.counter),
+            "peak_bytes": peak,
+        }
+    )
+    return round_trips
+
+
+@pytest.mark.parametrize("size", SIZES)
+def test_reconcile_new_guild(benchmark, database, size):
+    guild = FakeGuild(size)
+    bot = ComboBot()
+
+    def clear():
+        database.sync.database.database["ComboData"].delete_many({})
+
+    assert measure(benchmark, database, lambda: bot.reconcile_guild(guild), clear) == 2
+    assert database.sync.database.database["ComboData"].count_documents({}) == size
+
+
+@pytest.mark.parametrize("size", SIZES)
+def test_reconcile_synced_guild(benchmark, database, size):
+    guild = FakeGuild(size)
+    populate(database, guild)
+    bot = ComboBot()
+    assert measure(benchmark, database, lambda: bot.reconcile_guild(guild)) == 1
+
+
+@pytest.mark.parametrize("size", SIZES)
+def test_member_join(benchmark, database, size):
+    guild = FakeGuild(size)
+    populate(database, guild)
+    bot = FakeBot(guild)
+    cog = greetings.Greetings(bot)
+
+    async def join():
+        await cog.on_member_join(guild.join())
+        await bot.membership.flush()
+
+    assert measure(benchmark, database, join) <= 2
+
+
+def test_member_join_keeps_other_documents_cached(database):
+    guild = FakeGuild(1_000)
+    populate(database, guild)
+    cog = greetings.Greetings(FakeBot(guild))
+
+    async def join():
+        await database.find_document_by_id("ComboData", 1)
+        await database.queue_update("ComboData", 2, {"nudged": True})
+        await cog.on_member_join(guild.join())
+        database.sync.database.counter.clear()
+        assert (await database.find_document_by_id("ComboData", 1))["_id"] == 1
+        assert database.sync.database.round_trips == 0
+        assert not (await database.find_document_by_id("ComboData", 2))["nudged"]
+
+    asyncio.run(join())
+
+
+@pytest.mark.parametrize("size", SIZES)
+def test_verify_button(benchmark, database, size):
+    guild = FakeGuild(size)
+    populate(database, guild)
+    members = iter(guild.members)
+
+    bot = FakeBot(guild)
+
+    async def verify():
+        view = verification.VerifyButton(bot)
+        await view.verify_button.callback(FakeInteraction(next(members)))
+        await bot.membership.flush()
+
+    assert measure(benchmark, database, verify) == 1
+
+
+def test_verify_button_creates_missing_document(database):
+    guild = FakeGuild(10)
+    bot = FakeBot(guild)
+    member = guild.members[0]
+
+    async def verify():
+        view = verification.VerifyButton(bot)
+        await view.verify_button.callback(FakeInteraction(member))
+        database.sync.database.counter.clear()
+        # The write left the verification in the cache, so the second click is free.
+        await view.verify_button.callback(FakeInteraction(member))
+        assert database.sync.database.round_trips == 0
+        return await database.find_document_by_id("ComboData", member.id)
+
+    document = asyncio.run(verify())
+    assert document["verified"] and document["username"] == member.name
+    assert bot.membership.stats()["roles"] == 1
+    assert bot.stats.get(guild.id)["verified"] == 1
+
+
+@pytest.mark.parametrize("size", SIZES)
+def test_mass_leave(benchmark, database, size):
+    guild = FakeGuild(size)
+    populate(database, guild)
+    collection = database.sync.database.database["ComboData"]
+    collection.update_one({"_id": 1}, {"$set": {"ban_time": 2**31}})
+    collection.update_one({"_id": 2}, {"$set": {"blacklisted": True}})
+    collection.update_one({"_id": 3}, {"$set": {"warns": {"spam": 1}}})
+    cog = greetings.Greetings(FakeBot(guild))
+
+    async def leave():
+        for member in guild.members:
+            payload = SimpleNamespace(user=member, guild_id=guild.id)
+            await cog.on_raw_member_remove(payload)
+        await cog.bot.membership.flush()
+
+    assert measure(benchmark, database, leave) == 1
+    assert sorted(collection.distinct("_id")) == [1, 2, 3]
+
+
+def test_cached_lookups(benchmark, database):
+    guild = FakeGuild(1_000)
+    populate(database, guild)
+
+    async def lookups():
+        for _ in range(1_000):
+            await database.find_document_by_id("ComboData", 1)
+
+    assert measure(benchmark, database, lookups) <= 1
+
+
+def test_mirrored_lookups(benchmark, database):
+    guild = FakeGuild(1_000)
+    populate(database, guild)
+    database.sync.enable_mirror("ComboData", change_streams=False).load()
+
+    async def lookups():
+        for member in guild.members:
+            await database.find_document_by_id("ComboData", member.id)
+
+    assert measure(benchmark, database, lookups) == 0
+
+
+def test_queued_updates(benchmark, database):
+    guild = FakeGuild(1_000)
+    populate(database, guild)
+
+    async def updates():
+        for member in guild.members:
+            await database.queue_update("ComboData", member.id, {"nudged": True})
+        await database.flush()
+
+    assert measure(benchmark, database, updates) <= 2
+
+
+def test_queued_updates_stay_batched_across_other_writes(database):
+    guild = FakeGuild(200)
+    populate(database, guild)
+    cog = greetings.Greetings(FakeBot(guild))
+
+    async def storm():
+        for id in range(1, 101):
+            await database.queue_update("ComboData", id, {"nudged": True})
+            await database.update_document_if_matches(
+                "ComboData", 100 + id, {"verified": False}, {"verified": True}
+            )
+        nudged = await database.find_document_ids("ComboData", {"nudged": True})
+        await database.flush()
+        return nudged
+
+    assert asyncio.run(storm()) == set(range(1, 101))
+    assert database.sync.database.counter == {
+        "update_one": 100,
+        "find": 1,
+        "bulk_write": 1,
+    }
+    assert (
+        database.sync.database.database["ComboData"].count_documents(
+            {"nudged": True, "verified": True}
+        )
+        == 0
+    )
+    assert (
+        database.sync.database.database["ComboData"].count_documents({"nudged": True})
+        == 100
+    )
+
+    async def join():
+        database.sync.database.counter.clear()
+        await database.queue_update("ComboData", 1, {"nudged": True})
+        await cog.on_member_join(guild.join())
+
+    asyncio.run(join())
+    assert (
+        database.sync.database.database["ComboData"].count_documents({"nudged": True})
+        == 0
+    )
@@ -0,0 +1,148 @@
+"""
+Copyright (c) 2023 Combo Gang. All rights reserved.
+
+This work is licensed under the terms of the MIT license.  
+For a copy, see <https://opensource.org/licenses/MIT>.
+"""
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+from discord.ext.commands import AutoShardedBot
+
+from fakes import FakeBot, FakeGuild
+from src.base import config
+from src.base.database import AsyncMongoDBUtility
+from src.base.models import MemberRecord
+from src.bot.bot import ComboBot, cog_names
+
+
+def test_cogs_load_and_sync_only_when_commands_change(monkeypatch, tmp_path):
+    monkeypatch.setattr(config, "COMMAND_HASH_PATH", str(tmp_path / "tree.sha256"))
+    bot = ComboBot()
+    synced = []
+
+    async def sync():
+        synced.append(True)
+
+    monkeypatch.setattr(bot.tree, "sync", sync)
+
+    async def start():
+        await bot.load_cogs()
+        first = await bot.sync_commands()
+        second = await bot.sync_commands()
+        bot.tree.remove_command("sendverify")
+        third = await bot.sync_commands()
+        return first, second, third
+
+    assert asyncio.run(start()) == (True, False, True)
+    assert len(synced) == 2
+    assert set(cog_names()) == {
+        extension.rsplit(".", 1)[1] for extension in bot.extensions
+    }
+
+
+def test_close_drains_events_before_the_database(monkeypatch):
+    calls = []
+
+    def record(name):
+        async def call(*args, **kwargs):
+            calls.append(name)
+
+        return call
+
+    class Database:
+        sync = SimpleNamespace(mirror=None)
+        flush = record("database flush")
+
+        def close(self):
+            calls.append("database close")
+
+    monkeypatch.setitem(vars(config), "DATABASE", Database())
+    monkeypatch.setattr(AutoShardedBot, "close", record("gateway close"))
+    bot = ComboBot()
+    monkeypatch.setattr(bot.membership, "flush", record("membership flush"))
+    monkeypatch.setattr(bot.actions, "drain", record("actions drain"))
+    monkeypatch.setattr(bot.punishments, "stop", record("timers stop"))
+    bot.view_expiry.schedule(("nudge", 1), time.time() + 30, record("nudge expired"))
+
+    async def close():
+        await bot.close()
+        bot.dispatch("member_join", None)
+        await bot.close()
+
+    asyncio.run(close())
+    assert calls == [
+        "nudge expired",
+        "timers stop",
+        "membership flush",
+        "actions drain",
+        "gateway close",
+        "database flush",
+        "database close",
+    ]
+
+
+def test_stats_are_seeded_after_the_shard_is_reconciled(monkeypatch):
+    calls = []
+    guild = FakeGuild(0)
+    guild.shard_id = 0
+    monkeypatch.setattr(ComboBot, "guilds", [guild])
+    bot = ComboBot()
+
+    async def reconcile_guild(guild):
+        await asyncio.sleep(0.05)
+        calls.append("reconcile")
+
+    async def record(name):
+        calls.append(name)
+
+    monkeypatch.setattr(bot, "reconcile_guild", reconcile_guild)
+    monkeypatch.setattr(bot.punishments, "load", lambda: record("punishments"))
+    monkeypatch.setattr(bot.stats, "seed", lambda guild: record("seed"))
+
+    async def ready():
+        await asyncio.gather(bot.on_shard_ready(0), bot.on_ready())
+
+    asyncio.run(ready())
+    assert calls == ["punishments", "reconcile", "seed"]
+
+
+def test_stats_follow_events_and_debounce_presence(monkeypatch):
+    mongomock = pytest.importorskip("mongomock")
+    database = AsyncMongoDBUtility(mongomock.MongoClient(), "CombosBotStats")
+    monkeypatch.setitem(vars(config), "DATABASE", database)
+    guild = FakeGuild(3)
+    database.sync.database["ComboData"].insert_many(
+        [
+            MemberRecord(1, verified=True).to_document(),
+            MemberRecord(2, ban_time=2**31, mute_time=2**31).to_document(),
+            MemberRecord(3).to_document(),
+        ]
+    )
+    bot = FakeBot(guild)
+    bot.stats.interval = 0.05
+
+    async def run():
+        await bot.stats.seed(guild)
+        seeded = bot.stats.get(guild.id)
+        await asyncio.sleep(0)
+        first = bot.activity.name
+        bot.stats.joined(guild.join())
+        bot.stats.joined(guild.join())
+        bot.stats.verified(guild.id)
+        bot.stats.punished(guild.id, -1)
+        await asyncio.sleep(0.1)
+        return seeded, first, bot.activity.name
+
+    seeded, first, second = asyncio.run(run())
+    database.close()
+    assert seeded == {"members": 3, "verified": 1, "unverified": 2, "punished": 2}
+    assert (first, second) == ("3 Members", "5 Members")
+    assert bot.stats.get(guild.id) == {
+        "members": 5,
+        "verified": 2,
+        "unverified": 3,
+        "punished": 1,
+    }
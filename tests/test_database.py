@@ -4,3 +4,64 @@ Copyright (c) 2023 Combo Gang. All rights reserved.
 This work is licensed under the terms of the MIT license.  
 For a copy, see <https://opensource.org/licenses/MIT>.
 """
+import os
+import pytest
+from src.base.cache import DocumentCache
+from src.base.database import MongoDBUtility
+from src.base.mirror import LocalMirror
+from src.base.models import INDEXES, Queries
+
+MONGO_TEST_URI = os.environ.get("MONGO_TEST_URI")
+
+
+@pytest.mark.skipif(not MONGO_TEST_URI, reason="MONGO_TEST_URI is not set")
+def test_known_queries_use_indexes():
+    database = MongoDBUtility(MONGO_TEST_URI, "CombosBotTest")
+    try:
+        database.ensure_indexes("ComboData", INDEXES["ComboData"])
+        database.ensure_indexes("ComboData", INDEXES["ComboData"])
+        queries = {query.name: query.value for query in Queries}
+        assert database.find_collection_scans("ComboData", queries) == []
+    finally:
+        database.client.drop_database("CombosBotTest")
+
+
+def test_reads_racing_a_write_are_not_cached():
+    mongomock = pytest.importorskip("mongomock")
+    database = MongoDBUtility(mongomock.MongoClient(), "CombosBotTest", DocumentCache())
+    collection = database.database["ComboData"]
+    collection.insert_one({"_id": 1, "verified": False})
+
+    class RacingCollection:
+        def find_one(self, *args, **kwargs):
+            document = collection.find_one(*args, **kwargs)
+            database.database = {"ComboData": collection}
+            database.update_document("ComboData", {"_id": 1}, {"verified": True})
+            return document
+
+    database.database = {"ComboData": RacingCollection()}
+    assert not database.find_document_by_id("ComboData", 1)["verified"]
+    assert database.find_document_by_id("ComboData", 1)["verified"]
+
+
+def test_reloads_racing_a_write_drop_the_invalidated_documents():
+    mongomock = pytest.importorskip("mongomock")
+    collection = mongomock.MongoClient()["CombosBotTest"]["ComboData"]
+    collection.insert_many([{"_id": 1, "verified": False}, {"_id": 2}])
+    mirror = LocalMirror(collection, change_streams=False)
+
+    class RacingCollection:
+        def find(self, *args, **kwargs):
+            documents = list(collection.find(*args, **kwargs))
+            collection.update_one({"_id": 1}, {"$set": {"verified": True}})
+            mirror.invalidate(1)
+            return documents
+
+    mirror.collection = RacingCollection()
+    assert mirror.load() == 1
+    assert mirror.get(1) is None
+    assert mirror.get(2) == {"_id": 2}
+    mirror.invalidate(2)
+    mirror.collection = collection
+    assert mirror.load() == 2
+    assert mirror.get(1)["verified"]
@@ -0,0 +1,103 @@
+"""
+Copyright (c) 2023 Combo Gang. All rights reserved.
+
+This work is licensed under the terms of the MIT license.  
+For a copy, see <https://opensource.org/licenses/MIT>.
+"""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from discord import HTTPException, RateLimited
+
+from src.bot.executor import ActionExecutor
+
+
+def failing(*errors: Exception):
+    """Builds an action raising the errors in turn, then returning its call count"""
+    calls = []
+
+    async def action():
+        calls.append(None)
+        if len(calls) <= len(errors):
+            raise errors[len(calls) - 1]
+        return len(calls)
+
+    return action
+
+
+def http_error(status: int) -> HTTPException:
+    return HTTPException(SimpleNamespace(status=status, reason=str(status)), "error")
+
+
+@pytest.mark.parametrize(
+    "error", [http_error(429), http_error(500), RateLimited(0)], ids=str
+)
+def test_rate_limits_and_server_errors_are_retried(error):
+    executor = ActionExecutor(backoff=0)
+    result = asyncio.run(executor.submit("ban", failing(error, error)))
+    assert result == 3
+    assert executor.stats() == {
+        "submitted": 1,
+        "in_flight": 0,
+        "retried": 2,
+        "completed": 1,
+    }
+
+
+def test_client_errors_fail_without_retrying():
+    executor = ActionExecutor(backoff=0)
+    with pytest.raises(HTTPException):
+        asyncio.run(executor.submit("ban", failing(http_error(403))))
+    assert executor.stats()["failed"] == 1
+    assert "retried" not in executor.stats()
+
+
+def test_retries_give_up_after_the_limit():
+    executor = ActionExecutor(retries=2, backoff=0)
+    action = failing(*(http_error(500) for _ in range(3)))
+    with pytest.raises(HTTPException):
+        asyncio.run(executor.submit("ban", action))
+    assert executor.stats()["retried"] == 2
+    assert executor.stats()["failed"] == 1
+
+
+def test_backoff_doubles_between_retries(monkeypatch):
+    waits = []
+
+    async def sleep(seconds):
+        waits.append(seconds)
+
+    monkeypatch.setattr(asyncio, "sleep", sleep)
+    executor = ActionExecutor(backoff=1)
+    error = http_error(500)
+    asyncio.run(executor.submit("ban", failing(error, error, RateLimited(5))))
+    assert waits == [1, 2, 5]
+
+
+def test_concurrency_is_bounded_per_route_and_overall():
+    executor = ActionExecutor(concurrency=4, per_route=2)
+    running = {"ban": 0, "timeout": 0, "add_roles": 0}
+    peaks = {"total": 0, **running}
+
+    def action(route):
+        async def run():
+            running[route] += 1
+            peaks[route] = max(peaks[route], running[route])
+            peaks["total"] = max(peaks["total"], sum(running.values()))
+            await asyncio.sleep(0.01)
+            running[route] -= 1
+
+        return run
+
+    async def run():
+        await asyncio.gather(
+            *(
+                executor.map(route, [action(route) for _ in range(6)])
+                for route in running
+            )
+        )
+
+    asyncio.run(run())
+    assert peaks == {"total": 4, "ban": 2, "timeout": 2, "add_roles": 2}
+    assert executor.stats()["completed"] == 18
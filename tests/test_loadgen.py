@@ -0,0 +1,42 @@
+"""
+Copyright (c) 2023 Combo Gang. All rights reserved.
+
+This work is licensed under the terms of the MIT license.  
+For a copy, see <https://opensource.org/licenses/MIT>.
+"""
+import asyncio
+
+import pytest
+
+pytest.importorskip("mongomock")
+
+import loadgen
+from src.base import config
+
+
+@pytest.mark.parametrize("scenario", sorted(loadgen.SCENARIOS))
+def test_scenarios_run_without_errors(scenario):
+    generator = loadgen.LoadGenerator(members=200, latency=0)
+    try:
+        report = asyncio.run(generator.run(scenario, rate=500, duration=0.2))
+    finally:
+        generator.close()
+    assert all(latency["errors"] == 0 for latency in report["latency"].values())
+    assert report["latency"]["ready"]["count"] == 1
+    # A join after nudges also writes them and resets them.
+    assert report["db_ops_per_event"] <= 3
+    text = loadgen.format_report(report)
+    assert scenario in text and "API calls per event" in text
+    assert "DATABASE" not in vars(config)
+
+
+def test_leaves_past_the_member_count_are_skipped():
+    generator = loadgen.LoadGenerator(members=20, latency=0)
+    try:
+        report = asyncio.run(generator.run("mass-leave", rate=500, duration=0.2))
+    finally:
+        generator.close()
+    assert report["events"]["leave"] > 20
+    assert report["latency"]["leave"]["errors"] == 0
+    assert report["skipped"]["leave"] == report["events"]["leave"] - 20
+    assert not generator.discord.guild.members
@@ -0,0 +1,39 @@
+"""
+Copyright (c) 2023 Combo Gang. All rights reserved.
+
+This work is licensed under the terms of the MIT license.  
+For a copy, see <https://opensource.org/licenses/MIT>.
+"""
+from src.base.metrics import Histogram, Metrics
+
+
+def test_histogram_buckets_are_upper_bounds():
+    histogram = Histogram((0.01, 0.1, 1))
+    for value in (0.005, 0.01, 0.05, 0.5, 5):
+        histogram.observe(value)
+    assert histogram.counts == [2, 1, 1, 1]
+    assert histogram.count == 5
+    assert histogram.quantile(0.5) == 0.1
+    assert histogram.quantile(1) == float("inf")
+
+
+def test_render_exposes_histograms_in_flight_counts_and_gauges():
+    metrics = Metrics("test")
+    metrics.observe("handler", 0.003, handler="join")
+    metrics.observe("handler", 20, handler="join")
+    with metrics.track("mongo", operation="find"):
+        in_flight = metrics.render()
+    metrics.register_gauge("queue", lambda: {"roles": 2})
+    lines = metrics.render().splitlines()
+
+    assert 'test_mongo_in_flight{operation="find"} 1' in in_flight
+    assert lines[0] == "# TYPE test_handler_seconds histogram"
+    assert 'test_handler_seconds_bucket{handler="join",le="0.001"} 0' in lines
+    assert 'test_handler_seconds_bucket{handler="join",le="0.005"} 1' in lines
+    assert 'test_handler_seconds_bucket{handler="join",le="10"} 1' in lines
+    assert 'test_handler_seconds_bucket{handler="join",le="+Inf"} 2' in lines
+    assert 'test_handler_seconds_sum{handler="join"} 20.003' in lines
+    assert 'test_handler_seconds_count{handler="join"} 2' in lines
+    assert "# TYPE test_mongo_seconds histogram" in lines
+    assert 'test_mongo_in_flight{operation="find"} 0' in lines
+    assert lines[-2:] == ["# TYPE test_queue gauge", 'test_queue{key="roles"} 2']
@@ -0,0 +1,103 @@
+"""
+Copyright (c) 2023 Combo Gang. All rights reserved.
+
+This work is licensed under the terms of the MIT license.  
+For a copy, see <https://opensource.org/licenses/MIT>.
+"""
+import asyncio
+import time
+
+import pytest
+
+from fakes import FakeBot, FakeGuild
+from src.base import config
+from src.base.database import AsyncMongoDBUtility
+from src.base.models import MemberRecord
+from src.bot.scheduler import TimerHeap
+
+
+def test_timers_fire_at_their_deadline_and_rescheduling_replaces_them():
+    fired = []
+
+    async def run():
+        timers = TimerHeap()
+        timers.start()
+        start = time.time()
+
+        def record(key):
+            async def callback():
+                fired.append((key, time.time() - start))
+
+            return callback
+
+        timers.schedule("late", start + 0.1, record("late"))
+        timers.schedule("moved", start + 0.2, record("moved"))
+        timers.schedule("moved", start + 0.05, record("moved"))
+        timers.schedule("cancelled", start + 0.02, record("cancelled"))
+        timers.cancel("cancelled")
+        await asyncio.sleep(0.3)
+        await timers.stop()
+        return len(timers)
+
+    assert asyncio.run(run()) == 0
+    assert [key for key, _ in fired] == ["moved", "late"]
+    assert fired[0][1] >= 0.05 and fired[1][1] >= 0.1
+
+
+def test_expire_runs_pending_timers_early_in_deadline_order():
+    fired = []
+
+    async def run():
+        timers = TimerHeap()
+        timers.start()
+        now = time.time()
+        for key, delay in [("second", 20), ("first", 10), ("third", 30)]:
+            timers.schedule(key, now + delay, lambda key=key: record(key))
+        await timers.stop()
+        await timers.expire()
+        return len(timers), timers.heap
+
+    async def record(key):
+        fired.append(key)
+
+    assert asyncio.run(run()) == (0, [])
+    assert fired == ["first", "second", "third"]
+
+
+def test_load_restores_active_punishments_and_lifts_expired_ones(monkeypatch):
+    mongomock = pytest.importorskip("mongomock")
+    database = AsyncMongoDBUtility(mongomock.MongoClient(), "CombosBotScheduler")
+    monkeypatch.setitem(vars(config), "DATABASE", database)
+    now = time.time()
+    collection = database.sync.database["ComboData"]
+    collection.insert_many(
+        [
+            MemberRecord(1, mute_time=now + 3600).to_document(),
+            MemberRecord(2, mute_time=now - 1).to_document(),
+            MemberRecord(3, ban_time=now - 1).to_document(),
+            MemberRecord(4).to_document(),
+        ]
+    )
+    guild = FakeGuild(4)
+    guild.members[1].timed_out_until = now + 10
+    bot = FakeBot(guild)
+
+    async def run():
+        scheduled = await bot.punishments.load()
+        bot.punishments.start()
+        await asyncio.sleep(0.05)
+        await bot.actions.drain()
+        await bot.punishments.stop()
+        return scheduled
+
+    assert asyncio.run(run()) == 3
+    database.close()
+    assert guild.members[0].timed_out_until is not None
+    assert guild.members[1].timed_out_until is None
+    assert guild.unbanned == [3]
+    assert {
+        document["_id"]: (document["ban_time"], document["mute_time"])
+        for document in collection.find()
+    } == {1: (0, now + 3600), 2: (0, 0), 3: (0, 0), 4: (0, 0)}
+    assert ("mute", 1) in bot.punishments.timers
+    assert bot.actions.stats()["completed"] == 3
@@ -0,0 +1,38 @@
+"""
+Copyright (c) 2023 Combo Gang. All rights reserved.
+
+This work is licensed under the terms of the MIT license.  
+For a copy, see <https://opensource.org/licenses/MIT>.
+"""
+import asyncio
+import time
+
+from src.base.metrics import METRICS
+from src.bot.watchdog import LoopWatchdog
+
+
+def block_the_loop(seconds: float):
+    time.sleep(seconds)
+
+
+def test_a_stall_is_reported_once_with_the_blocking_stack(tmp_path):
+    log_path = tmp_path / "watchdog.log"
+    watchdog = LoopWatchdog(threshold=0.1, interval=0.02, log_path=str(log_path))
+    lags = sum(histogram.count for histogram in METRICS.histograms["loop_lag"].values())
+
+    async def run():
+        watchdog.start()
+        await asyncio.sleep(0.05)
+        block_the_loop(0.3)
+        await asyncio.sleep(0.1)
+        watchdog.stop()
+
+    asyncio.run(run())
+    report = log_path.read_text()
+    assert report.count("Event loop blocked for more than 0.1s") == 1
+    assert "block_the_loop" in report
+    assert "Event loop was blocked" not in report
+    assert (
+        sum(histogram.count for histogram in METRICS.histograms["loop_lag"].values())
+        > lags
+    )